@@ -8,7 +8,6 @@ import astrbot.api.message_components as Comp
 import re
 import os
 import asyncio
-import httpx
 from typing import List
 from datetime import datetime
 
@@ -21,9 +20,14 @@ from .modules.bilibili import (
     parse_b23,
     parse_video,
     estimate_size,
+    fetch_play_info,
+    plan_quality,
+    CodecPolicy,
+    CODEC_COMPAT_ORDER,
     init_bili_module,
     bili_login,
-    check_cookie_valid,
+    COOKIE_HEALTH,
+    get_bitrate_store,
     UnsupportedBiliLinkError,
 )
 from .modules.douyin import (
@@ -33,6 +37,7 @@ from .modules.douyin import (
     get_effective_douyin_cookie,
     format_douyin_failure_message,
     send_douyin_with_title_forward,
+    configure_slides_batch,
 )
 from .modules.xiaohongshu import (
     XiaohongshuParser,
@@ -47,6 +52,10 @@ from .modules.nga import (
     NgaDownloader,
 )
 from .modules.auto_delete import delete_old_files
+from .modules.http_pool import close_http_client
+from .modules.short_link import SHORT_LINKS, init_short_link_cache
+from .modules.faststart import ensure_faststart, faststart_summary
+from .modules.transcode import TRANSCODE_MAX_INPUT_RATIO, transcode_to_fit
 from .modules.parse_guard import (
     ParseGuard,
     check_group_level_requirement,
@@ -96,24 +105,37 @@ class videoAnalysis(Star):
         bili_config = platform_parse_config.get("bilibili", {}) or {}
         self.bili_quality = bili_config.get("quality", 64)
         self.bili_use_login = bili_config.get("use_login", False)
+        self.bili_backend = bili_config.get("download_backend", "native") or "native"
+        bili_codecs = bili_config.get("codecs", ["avc"]) or ["avc"]
+        self.bili_codec_policy = CodecPolicy(
+            [c for c in CODEC_COMPAT_ORDER if c in bili_codecs],
+            smallest=bili_config.get("codec_mode", "compatible") == "smallest",
+        )
 
         douyin_config = platform_parse_config.get("douyin", {}) or {}
         self._douyin_cookie_from_config = douyin_config.get("cookie", "") or ""
-        self._douyin_cookie_from_file = ""
-        self._douyin_cookie_loaded = False
         self.douyin_api_url = douyin_config.get("api_url", "")
+        configure_slides_batch(
+            douyin_config.get("slides_batch_window", 0.2),
+            douyin_config.get("slides_batch_size", 10),
+        )
         xhs_config = platform_parse_config.get("xhs", {}) or {}
         self._xhs_cookie = xhs_config.get("cookie", "") or ""
         self._xhs_image_quality = (
             xhs_config.get("image_quality", "original") or "original"
         )
         self.tieba_sort = platform_parse_config.get("tieba_sort", "time")
+        self.tieba_hot_pages = platform_parse_config.get("tieba_hot_pages", 3)
 
         nga_config = platform_parse_config.get("nga", {}) or {}
         self.nga_cookie = nga_config.get("cookie", "")
         self.nga_sort = nga_config.get("sort", "time")
 
         self.max_video_size = delivery_config.get("max_video_size", 200)
+        self.transcode_oversize = delivery_config.get("transcode_oversize", False)
+        self.transcode_max_overshoot = max(
+            1.0, float(delivery_config.get("transcode_max_overshoot", 1.5) or 1.5)
+        )
         self.delete_time = delivery_config.get("delete_time", 60)
         self.media_max_images = delivery_config.get("max_images", 20)
         self.media_max_replies = delivery_config.get("max_replies", 20)
@@ -168,7 +190,16 @@ class videoAnalysis(Star):
         # 初始化 bilibili 模块
         cookie_file = os.path.join(self.data_dir, "bili_cookies.json")
         init_bili_module(cookie_file)
-        init_douyin_login(self.data_dir)
+        init_douyin_login(self.data_dir, self._douyin_cookie_from_config)
+        init_short_link_cache(self.data_dir)
+
+    async def initialize(self):
+        if self.bili_use_login:
+            COOKIE_HEALTH.start()
+
+    async def terminate(self):
+        await COOKIE_HEALTH.stop()
+        await close_http_client()
 
     def _build_parse_throttle_key(self, event: AstrMessageEvent):
         """限频作用域固定为群聊成员：group_id + sender_id"""
@@ -206,7 +237,8 @@ class videoAnalysis(Star):
         )
 
     async def _send_file_if_needed(self, file_path: str) -> str:
-        return file_path
+        """发送前处理：视频文件按需做 faststart 重封装。"""
+        return await ensure_faststart(file_path)
 
     def _create_node(self, event, content):
         """Helper function to create a node with consistent format"""
@@ -373,6 +405,20 @@ class videoAnalysis(Star):
 
         return
 
+    async def _transcode_to_fit(
+        self, file_path: str, max_size_mb: float, duration: float = 0
+    ) -> str | None:
+        """将超限视频转码到 max_size_mb 以内，成功返回新文件路径。"""
+        fit_path = f"{os.path.splitext(file_path)[0]}.fit.mp4"
+        if (
+            os.path.exists(fit_path)
+            and os.path.getsize(fit_path) <= max_size_mb * 1024 * 1024
+        ):
+            return fit_path
+        return await transcode_to_fit(
+            file_path, fit_path, int(max_size_mb * 1024 * 1024), duration
+        )
+
     async def _handle_bili_parsing(self, event: AstrMessageEvent, url: str):
         """
         Bilibili 解析与下载核心流程。
@@ -431,12 +477,38 @@ class videoAnalysis(Star):
         # 通过检查，贴上正在解析的表情
         await self._set_emoji(event, 424)
 
-        # 步骤 2：智能预估起始清晰度（不使用固定降级次数上限）
+        # 步骤 2：按 playurl 返回的码率精确规划起始清晰度，失败时回退到预估码率
+        play_info = None
+        if self.smart_downgrade or self.bili_backend == "native":
+            play_info = await fetch_play_info(
+                video_info.bvid, video_info.cid, use_login=use_login
+            )
+        available_qualities = sorted(
+            {s.quality for s in play_info.video} if play_info else set(),
+            reverse=True,
+        )
+
         target_quality = initial_quality
-        if self.smart_downgrade and video_duration > 0:
+        planned = None
+        if self.smart_downgrade and video_duration > 0 and play_info:
+            planned = plan_quality(
+                play_info, initial_quality, max_size, self.bili_codec_policy
+            )
+        if planned:
+            target_quality, expected_mb = planned
+            logger.debug(
+                f"精确规划：视频时长 {play_info.duration:.0f}s，初始质量 {initial_quality} -> {target_quality}，预期大小 {expected_mb:.2f}MB。"
+            )
+        elif self.smart_downgrade and video_duration > 0:
             temp_quality = initial_quality
             while temp_quality >= 16:
-                estimated_size_mb = estimate_size(temp_quality, video_duration)
+                estimated_size_mb = estimate_size(
+                    temp_quality,
+                    video_duration,
+                    video_info.tname,
+                    codec=self.bili_codec_policy.preferred,
+                    upper=True,
+                )
                 if estimated_size_mb <= max_size:
                     break
                 next_q = DOWNGRADE_MAP.get(temp_quality)
@@ -450,6 +522,10 @@ class videoAnalysis(Star):
 
         current_quality = target_quality
 
+        def next_lower(quality: int) -> int | None:
+            lower = [q for q in available_qualities if q < quality]
+            return lower[0] if lower else DOWNGRADE_MAP.get(quality)
+
         # 步骤 3：下载 + 后置体积校验循环
         while True:
             if current_quality in attempted_qualities:
@@ -466,6 +542,24 @@ class videoAnalysis(Star):
                 f"正在尝试下载 (质量: {current_quality}，总尝试次数: {download_attempts})..."
             )
 
+            # 请求的清晰度高于 playurl 实际提供的最高档时，下载到的是不高于它的最高档，
+            # 下一档要从实际能下载到的清晰度往下找，否则会重复下载同一条流
+            served_quality = next(
+                (q for q in available_qualities if q <= current_quality),
+                current_quality,
+            )
+            next_quality = next_lower(served_quality)
+            can_downgrade = next_quality is not None and next_quality != served_quality
+
+            # 启用转码时允许适度超限的文件下载完成，交给转码处理；
+            # 已无法降级时放宽到转码可接受的上限，但仍不允许无限大的文件
+            download_limit = max_size
+            if self.transcode_oversize and max_size != float("inf"):
+                overshoot = self.transcode_max_overshoot
+                if not can_downgrade:
+                    overshoot = max(overshoot, TRANSCODE_MAX_INPUT_RATIO)
+                download_limit = max_size * overshoot
+
             try:
                 result = await process_bili_video(
                     url,
@@ -474,12 +568,36 @@ class videoAnalysis(Star):
                     use_login=use_login,
                     event=None,
                     download_dir=os.path.join(self.download_dir, "bili"),
+                    backend=self.bili_backend,
+                    play_info=play_info,
+                    max_size_mb=download_limit,
+                    video_info=video_info,
+                    codec_policy=self.bili_codec_policy,
                 )
             except Exception as e:
                 logger.warning(f"下载失败（yutto执行异常）: {e}")
                 result = {"error": f"下载失败（yutto执行异常）: {e}"}
                 break
 
+            # 以实际下载到的清晰度为准
+            if result and result.get("quality"):
+                attempted_qualities.add(result["quality"])
+                next_quality = next_lower(result["quality"])
+                can_downgrade = (
+                    next_quality is not None and next_quality != result["quality"]
+                )
+
+            # 下载过程中已检测到超限并中止：直接尝试下一档清晰度
+            if result and result.get("size_exceeded"):
+                if can_downgrade:
+                    logger.warning(
+                        f"清晰度 {current_quality} 下载中途超出限制 {max_size}MB，直接降级重试..."
+                    )
+                    current_quality = next_quality
+                    continue
+                result["error"] = f"{result['error']}（已尝试最低清晰度）"
+                break
+
             file_path_rel = result.get("video_path") if result else None
             if not file_path_rel or not os.path.exists(file_path_rel):
                 # 如为 DASH 不支持错误，则不继续降级重试。
@@ -501,18 +619,23 @@ class videoAnalysis(Star):
                 )
                 break
 
-            # 文件超限：若可降级则继续尝试下一档清晰度
-            next_quality = DOWNGRADE_MAP.get(current_quality)
-            can_downgrade = next_quality is not None and next_quality != current_quality
+            # 已是最低清晰度或超出幅度不大：本地转码通常比重新下载更快
+            if self.transcode_oversize and (
+                not can_downgrade
+                or file_size_mb <= max_size * self.transcode_max_overshoot
+            ):
+                fitted = await self._transcode_to_fit(
+                    file_path_rel, max_size, result.get("duration") or 0
+                )
+                if fitted:
+                    result["video_path"] = fitted
+                    break
+
+            # 文件超限：保留该文件作为更高预算请求的缓存，继续尝试下一档清晰度
             if can_downgrade:
                 logger.warning(
-                    f"后置校验失败！文件实际大小 {file_size_mb:.2f}MB 超出限制 {max_size}MB。删除文件，准备降级重试..."
+                    f"后置校验失败！文件实际大小 {file_size_mb:.2f}MB 超出限制 {max_size}MB。准备降级重试..."
                 )
-                try:
-                    os.remove(file_path_rel)
-                    logger.debug(f"已删除超限文件（降级重试）: {file_path_rel}")
-                except Exception as e:
-                    logger.warning(f"删除超限文件失败: {e}")
                 current_quality = next_quality
                 continue
 
@@ -536,15 +659,7 @@ class videoAnalysis(Star):
         download_dir = os.path.join(self.download_dir, "douyin")
 
         # 获取 Cookie（用于本地解析）
-        (
-            cookie,
-            self._douyin_cookie_loaded,
-            self._douyin_cookie_from_file,
-        ) = await get_effective_douyin_cookie(
-            cookie_loaded=self._douyin_cookie_loaded,
-            cookie_from_config=self._douyin_cookie_from_config,
-            cookie_from_file=self._douyin_cookie_from_file,
-        )
+        cookie = await get_effective_douyin_cookie()
 
         # 步骤 1：解析（获取元数据 + 原始数据）
         parser = DouyinParser(
@@ -592,6 +707,7 @@ class videoAnalysis(Star):
                     max_images=self.media_max_images,
                     max_size=max_size,
                     smart_downgrade=self.smart_downgrade,
+                    transcode_oversize=self.transcode_oversize,
                 )
                 result = await downloader.download(parse_result, url)
 
@@ -692,7 +808,7 @@ class videoAnalysis(Star):
 
         parser = XiaohongshuParser(
             cookie=self._xhs_cookie,
-            prefer_original=(self._xhs_image_quality == "original"),
+            image_quality=self._xhs_image_quality,
         )
         parse_result = await parser.parse(url)
 
@@ -713,9 +829,14 @@ class videoAnalysis(Star):
 
         await self._set_emoji(event, 424)
 
+        max_size = self.max_video_size
+        if self.admin_bypass_content_restrictions and self._is_admin_event(event):
+            max_size = float("inf")
+
         downloader = XiaohongshuDownloader(
             download_dir=download_dir,
             max_images=self.media_max_images,
+            max_size=max_size,
         )
         result = await downloader.download(parse_result, url)
 
@@ -777,13 +898,10 @@ class videoAnalysis(Star):
     async def _handle_tieba_parsing(self, event: AstrMessageEvent, url: str):
         """贴吧解析和下载核心逻辑"""
         if "m.q.qq.com" in url:
-            try:
-                async with httpx.AsyncClient(timeout=10, follow_redirects=True) as cli:
-                    resp = await cli.get(url)
-                    url = str(resp.url)
+            resolved = await SHORT_LINKS.resolve(url)
+            if resolved:
+                url = resolved
                 logger.info(f"贴吧 QQ 小程序重定向至：{url}")
-            except Exception as e:
-                logger.warning(f"贴吧 QQ 小程序重定向失败: {e}")
             # m.q.qq.com 短链需 QQ 登录态才能解析，外部 Bot 无法获取真实帖吧 URL
             if "m.q.qq.com" in url:
                 logger.warning("贴吧 QQ 小程序短链解析失败，跳过")
@@ -795,7 +913,11 @@ class videoAnalysis(Star):
 
         download_dir = os.path.join(self.download_dir, "tieba")
 
-        parser = TiebaParser(max_replies=self.media_max_replies, sort=self.tieba_sort)
+        parser = TiebaParser(
+            max_replies=self.media_max_replies,
+            sort=self.tieba_sort,
+            hot_pages=self.tieba_hot_pages,
+        )
         parse_result = await parser.parse(url)
 
         if not parse_result.success:
@@ -811,9 +933,14 @@ class videoAnalysis(Star):
 
         await self._set_emoji(event, 424)
 
+        max_size = self.max_video_size
+        if self.admin_bypass_content_restrictions and self._is_admin_event(event):
+            max_size = float("inf")
+
         downloader = TiebaDownloader(
             download_dir=download_dir,
             max_images=self.media_max_images,
+            max_size=max_size,
         )
         result = await downloader.download(parse_result, url)
 
@@ -867,14 +994,20 @@ class videoAnalysis(Star):
                 if item["type"] == "image":
                     op_contents.append(Image.fromFileSystem(path=media_path))
                 else:
-                    op_contents.append(Comp.Video.fromFileSystem(path=media_path))
+                    op_contents.append(
+                        Comp.Video.fromFileSystem(
+                            path=await self._send_file_if_needed(media_path)
+                        )
+                    )
             except Exception as e:
                 logger.warning(f"贴吧媒体处理出错: {e}")
         nodes.append(Node(uin=sender_id, name="贴吧内容", content=op_contents))
 
         if result.get("video_path") and os.path.exists(result["video_path"]):
             try:
-                component = Comp.Video.fromFileSystem(path=result["video_path"])
+                component = Comp.Video.fromFileSystem(
+                    path=await self._send_file_if_needed(result["video_path"])
+                )
                 nodes.append(Node(uin=sender_id, name="贴吧内容", content=[component]))
             except Exception as e:
                 logger.warning(f"贴吧处理视频文件出错: {e}")
@@ -897,7 +1030,9 @@ class videoAnalysis(Star):
                         reply_contents.append(Image.fromFileSystem(path=media_path))
                     else:
                         reply_contents.append(
-                            Comp.Video.fromFileSystem(path=media_path)
+                            Comp.Video.fromFileSystem(
+                                path=await self._send_file_if_needed(media_path)
+                            )
                         )
                 except Exception as e:
                     logger.warning(f"贴吧回复媒体处理出错: {e}")
@@ -1007,7 +1142,11 @@ class videoAnalysis(Star):
                 if item["type"] == "image":
                     op_contents.append(Image.fromFileSystem(path=media_path))
                 else:
-                    op_contents.append(Comp.Video.fromFileSystem(path=media_path))
+                    op_contents.append(
+                        Comp.Video.fromFileSystem(
+                            path=await self._send_file_if_needed(media_path)
+                        )
+                    )
             except Exception as e:
                 logger.warning(f"NGA 媒体处理出错: {e}")
         nodes.append(Node(uin=sender_id, name="NGA内容", content=op_contents))
@@ -1042,7 +1181,9 @@ class videoAnalysis(Star):
                         reply_contents.append(Image.fromFileSystem(path=media_path))
                     else:
                         reply_contents.append(
-                            Comp.Video.fromFileSystem(path=media_path)
+                            Comp.Video.fromFileSystem(
+                                path=await self._send_file_if_needed(media_path)
+                            )
                         )
                 except Exception as e:
                     logger.warning(f"NGA 回复媒体处理出错: {e}")
@@ -1246,6 +1387,7 @@ class videoAnalysis(Star):
             cookies = await login_task
 
             if cookies:
+                await COOKIE_HEALTH.refresh()
                 yield event.plain_result("✅ B站登录成功！Cookie 已保存。")
             else:
                 yield event.plain_result("❌ 登录失败或超时，请重试。")
@@ -1269,15 +1411,58 @@ class videoAnalysis(Star):
         """
         logger.info("收到检查 Cookie 指令")
 
-        is_valid = await check_cookie_valid()
+        is_valid = await COOKIE_HEALTH.refresh()
 
         if is_valid:
-            yield event.plain_result("✅ B站 Cookie 有效")
+            yield event.plain_result(f"✅ B站 Cookie 有效\n{COOKIE_HEALTH.summary()}")
         else:
             yield event.plain_result(
-                "❌ B站 Cookie 无效或不存在，请使用 /bili_login 登录"
+                "❌ B站 Cookie 无效或不存在，请使用 /bili_login 登录\n"
+                f"{COOKIE_HEALTH.summary()}"
             )
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("bili_bitrate")
+    async def handle_bili_bitrate(self, event: AstrMessageEvent):
+        """
+        查看根据实际下载记录拟合的 B站 码率表（管理员）
+        """
+        store = get_bitrate_store()
+        rows = store.table(self.bili_codec_policy.preferred) if store else []
+        if not rows:
+            yield event.plain_result(
+                "暂无足够的下载记录，当前使用内置码率常量进行预估。"
+            )
+            return
+
+        lines = [
+            f"📊 B站 实测码率（{self.bili_codec_policy.preferred}，"
+            f"共 {len(store.records)} 条记录）"
+        ]
+        for row in rows:
+            category = row.category or "全部分区"
+            lines.append(
+                f"清晰度 {row.quality} | {category} | {row.mbps:.2f} Mbps "
+                f"({row.low:.2f}~{row.high:.2f}) | {row.samples} 个样本"
+            )
+        yield event.plain_result("\n".join(lines))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("short_link_stats")
+    async def handle_short_link_stats(self, event: AstrMessageEvent):
+        """
+        查看短链解析缓存命中率（管理员）
+        """
+        yield event.plain_result(SHORT_LINKS.summary())
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("faststart_stats")
+    async def handle_faststart_stats(self, event: AstrMessageEvent):
+        """
+        查看发送前 faststart 重封装的次数与耗时（管理员）
+        """
+        yield event.plain_result(faststart_summary())
+
 
 @filter.event_message_type(EventMessageType.ALL)
 async def auto_parse_dispatcher(
@@ -1514,16 +1699,6 @@ async def auto_parse_dispatcher(
         )
 
         if match_douyin:
-            (
-                cookie,
-                self._douyin_cookie_loaded,
-                self._douyin_cookie_from_file,
-            ) = await get_effective_douyin_cookie(
-                cookie_loaded=self._douyin_cookie_loaded,
-                cookie_from_config=self._douyin_cookie_from_config,
-                cookie_from_file=self._douyin_cookie_from_file,
-            )
-
             url = match_douyin.group(1)
             logger.info(f"成功匹配到抖音链接：{url}")
 
@@ -0,0 +1,9 @@
+"""asyncio 任务辅助函数"""
+
+import asyncio
+
+
+def discard_task(task: asyncio.Task) -> None:
+    """取消不再需要的请求，并吞掉其可能已产生的异常。"""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
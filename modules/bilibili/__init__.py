@@ -1,13 +1,19 @@
 from .process import process_bili_video
-from .constants import REG_B23
+from .constants import CODEC_COMPAT_ORDER, REG_B23
 from .parser import (
     REG_BV,
     REG_AV,
     av2bv,
+    bv2av,
+    normalize_bvid,
     parse_b23,
     parse_video,
     UnsupportedBiliLinkError,
 )
+from .bitrate import get_bitrate_store
+from .cookie_health import COOKIE_HEALTH
+from .model import CodecPolicy
+from .playurl import fetch_play_info, plan_quality
 from .utils import estimate_size, init_bili_module, bili_login, check_cookie_valid
 
 __all__ = [
@@ -16,11 +22,19 @@ __all__ = [
     "REG_BV",
     "REG_AV",
     "av2bv",
+    "bv2av",
+    "normalize_bvid",
     "parse_b23",
     "parse_video",
     "estimate_size",
+    "fetch_play_info",
+    "plan_quality",
+    "CodecPolicy",
+    "CODEC_COMPAT_ORDER",
     "init_bili_module",
     "bili_login",
     "check_cookie_valid",
+    "COOKIE_HEALTH",
+    "get_bitrate_store",
     "UnsupportedBiliLinkError",
 ]
@@ -0,0 +1,153 @@
+"""
+B站 实际码率记录与估算
+
+每次下载完成后记录 (清晰度, 时长, 字节数, 编码, 分区)，按清晰度 + 分区
+拟合平均码率及 95% 置信区间；样本不足时由调用方回退到固定常量。
+"""
+
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+
+import aiofiles
+
+from astrbot.api import logger
+
+BITRATE_MAX_RECORDS = 2000
+BITRATE_MIN_SAMPLES = 5
+
+
+@dataclass
+class BitrateEstimate:
+    quality: int
+    category: str
+    samples: int
+    mbps: float
+    low: float
+    high: float
+
+
+class BitrateStore:
+    def __init__(self, file_path: str, max_records: int = BITRATE_MAX_RECORDS):
+        self.file_path = file_path
+        self.max_records = max_records
+        self.records: list[dict] = self._load()
+
+    def _load(self) -> list[dict]:
+        if not os.path.exists(self.file_path):
+            return []
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return [r for r in data if isinstance(r, dict)][-self.max_records :]
+        except Exception as e:
+            logger.warning(f"读取 B站 码率记录失败，将重新记录: {e}")
+            return []
+
+    async def _save(self) -> None:
+        tmp_path = f"{self.file_path}.tmp"
+        try:
+            async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+                await f.write(json.dumps(self.records, ensure_ascii=False))
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            logger.warning(f"保存 B站 码率记录失败: {e}")
+
+    async def record(
+        self,
+        quality: int,
+        duration: float,
+        size_bytes: int,
+        codec: str = "avc",
+        category: str = "",
+    ) -> None:
+        if quality <= 0 or duration <= 0 or size_bytes <= 0:
+            return
+        self.records.append(
+            {
+                "quality": int(quality),
+                "duration": float(duration),
+                "bytes": int(size_bytes),
+                "codec": codec or "avc",
+                "category": category or "",
+                "time": int(time.time()),
+            }
+        )
+        del self.records[: -self.max_records]
+        mbps = size_bytes * 8 / duration / 1e6
+        logger.debug(
+            f"记录 B站 码率: 质量 {quality}，分区 {category or '未知'}，{mbps:.2f} Mbps"
+        )
+        await self._save()
+
+    def _fit(self, quality: int, category: str, codec: str) -> BitrateEstimate | None:
+        rates = [
+            r["bytes"] * 8 / r["duration"] / 1e6
+            for r in self.records
+            if r.get("quality") == quality
+            and r.get("codec", "avc") == codec
+            and (not category or r.get("category") == category)
+            and r.get("duration", 0) > 0
+        ]
+        n = len(rates)
+        if n < BITRATE_MIN_SAMPLES:
+            return None
+        mean = sum(rates) / n
+        stdev = math.sqrt(sum((x - mean) ** 2 for x in rates) / (n - 1))
+        margin = 1.96 * stdev / math.sqrt(n)
+        return BitrateEstimate(
+            quality=quality,
+            category=category,
+            samples=n,
+            mbps=mean,
+            low=max(0.0, mean - margin),
+            high=mean + margin,
+        )
+
+    def estimate(
+        self, quality: int, category: str = "", codec: str = "avc"
+    ) -> BitrateEstimate | None:
+        """优先使用同分区样本，不足时使用该清晰度的全部样本。"""
+        if category:
+            fitted = self._fit(quality, category, codec)
+            if fitted:
+                return fitted
+        return self._fit(quality, "", codec)
+
+    def table(self, codec: str = "avc") -> list[BitrateEstimate]:
+        keys = sorted(
+            {
+                (r.get("quality", 0), r.get("category", ""))
+                for r in self.records
+                if r.get("codec", "avc") == codec
+            },
+            key=lambda k: (-k[0], k[1]),
+        )
+        rows = []
+        for quality, category in keys:
+            if not category:
+                continue
+            fitted = self._fit(quality, category, codec)
+            if fitted:
+                rows.append(fitted)
+        for quality in sorted({k[0] for k in keys}, reverse=True):
+            fitted = self._fit(quality, "", codec)
+            if fitted:
+                rows.append(fitted)
+        return rows
+
+
+_STORE: BitrateStore | None = None
+
+
+def init_bitrate_store(file_path: str) -> BitrateStore:
+    global _STORE
+    _STORE = BitrateStore(file_path)
+    logger.debug(f"B站 码率记录已加载 {len(_STORE.records)} 条: {file_path}")
+    return _STORE
+
+
+def get_bitrate_store() -> BitrateStore | None:
+    return _STORE
@@ -0,0 +1,123 @@
+"""
+B站 下载缓存
+
+文件按 {bvid}_{cid}_{清晰度}_{编码}.mp4 命名，旁边的同名 .json 记录实际大小与时长。
+只有下载完成并写入元数据的文件才会被当作缓存命中。
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+
+from astrbot.api import logger
+
+from ..faststart import touch_source
+
+
+@dataclass
+class CacheEntry:
+    path: str
+    bvid: str
+    cid: int
+    quality: int
+    codec: str
+    size: int
+    duration: float
+
+
+def cache_path(download_dir: str, bvid: str, cid: int, quality: int, codec: str) -> str:
+    return os.path.join(download_dir, f"{bvid}_{cid}_{quality}_{codec}.mp4")
+
+
+def _meta_path(video_path: str) -> str:
+    return os.path.splitext(video_path)[0] + ".json"
+
+
+def store_cached(
+    src_path: str,
+    download_dir: str,
+    bvid: str,
+    cid: int,
+    quality: int,
+    codec: str,
+    duration: float,
+) -> CacheEntry:
+    """将下载完成的文件移动到缓存路径并写入元数据。"""
+    path = cache_path(download_dir, bvid, cid, quality, codec)
+    if os.path.abspath(src_path) != os.path.abspath(path):
+        os.replace(src_path, path)
+    entry = CacheEntry(
+        path=path,
+        bvid=bvid,
+        cid=cid,
+        quality=quality,
+        codec=codec,
+        size=os.path.getsize(path),
+        duration=duration,
+    )
+    meta = asdict(entry)
+    meta.pop("path")
+    tmp_path = _meta_path(path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, _meta_path(path))
+    return entry
+
+
+def list_cached(download_dir: str, bvid: str, cid: int) -> list[CacheEntry]:
+    prefix = f"{bvid}_{cid}_"
+    entries = []
+    try:
+        names = [
+            n
+            for n in os.listdir(download_dir)
+            if n.startswith(prefix) and n.endswith(".json")
+        ]
+    except OSError:
+        return []
+    for name in names:
+        meta_file = os.path.join(download_dir, name)
+        video_path = os.path.splitext(meta_file)[0] + ".mp4"
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # 大小不一致说明文件被截断或替换，不再作为缓存
+            if os.path.getsize(video_path) != meta.get("size"):
+                continue
+            entries.append(CacheEntry(path=video_path, **meta))
+        except (OSError, ValueError, TypeError) as e:
+            logger.debug(f"忽略无效的 B站 缓存记录 {name}: {e}")
+    return entries
+
+
+def find_cached(
+    download_dir: str,
+    bvid: str,
+    cid: int,
+    min_quality: int = 0,
+    max_bytes: int | None = None,
+    codecs: tuple[str, ...] | None = None,
+    max_quality: int | None = None,
+) -> CacheEntry | None:
+    """
+    返回清晰度在 [min_quality, max_quality] 内、不超出 max_bytes 且编码在 codecs 内的
+    最高清晰度缓存。
+    """
+    candidates = [
+        e
+        for e in list_cached(download_dir, bvid, cid)
+        if e.quality >= min_quality
+        and (max_quality is None or e.quality <= max_quality)
+        and (not max_bytes or e.size <= max_bytes)
+        and (not codecs or e.codec in codecs)
+    ]
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda e: (e.quality, -e.size))
+    # 刷新修改时间以延后自动清理；视频文件经 touch_source 刷新，保留其 faststart 结果
+    try:
+        touch_source(best.path)
+        os.utime(_meta_path(best.path), None)
+    except OSError:
+        pass
+    return best
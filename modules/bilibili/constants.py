@@ -2,6 +2,41 @@ import re
 
 API_BY_AID = "https://api.bilibili.com/x/web-interface/view?aid={}"
 API_BY_BVID = "https://api.bilibili.com/x/web-interface/view?bvid={}"
+API_PLAYURL = "https://api.bilibili.com/x/player/playurl"
+
+# av/bv 号互转参数
+BV_XOR_CODE = 23442827791579
+BV_MASK_CODE = 2251799813685247
+BV_MAX_AID = 1 << 51
+BV_ALPHABET = "FcwAPNKTMug3GV5Lj7EJnHpWsx4tb8haYeviqBz6rkCy12mUSDQX9RdoZf"
+BV_BASE = len(BV_ALPHABET)
+
+# playurl fnval：16=DASH，128=4K，1024=AV1；1=MP4（durl）
+FNVAL_DASH = 16 | 128 | 1024
+FNVAL_MP4 = 1
+
+# DASH codecid -> 编码名
+CODEC_NAMES = {7: "avc", 12: "hevc", 13: "av1"}
+# 按客户端兼容性从高到低排列
+CODEC_COMPAT_ORDER = ("avc", "hevc", "av1")
+
+# 内置下载器分段大小（字节）
+DASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# view 接口结果缓存：有效期（秒）与最大条目数
+VIEW_CACHE_TTL = 300
+VIEW_CACHE_SIZE = 256
+
+# Cookie 后台健康检查间隔（秒）
+COOKIE_CHECK_INTERVAL = 1800
+
+# yutto 进程池：同时运行的任务数、所有任务共享的下载线程总数
+YUTTO_MAX_JOBS = 2
+YUTTO_TOTAL_WORKERS = 16
+# yutto 下载监控：轮询间隔、无进度超时与单任务总时长上限（秒）
+YUTTO_POLL_INTERVAL = 1.0
+YUTTO_STALL_TIMEOUT = 60
+YUTTO_JOB_TIMEOUT = 1800
 
 ESTIMATED_BITRATES_MBPS = {
     120: 5.5,  # 4K
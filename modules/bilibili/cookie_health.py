@@ -0,0 +1,82 @@
+"""
+B站 Cookie 健康状态
+
+后台定期调用 check_cookie_valid 并缓存结果，下载时据此直接选择登录或免登录模式，
+避免在 Cookie 已失效时先做一次注定失败的高清下载。
+"""
+
+import asyncio
+import time
+
+from astrbot.api import logger
+
+from . import utils
+from .constants import COOKIE_CHECK_INTERVAL
+
+
+class CookieHealth:
+    def __init__(self, interval: float = COOKIE_CHECK_INTERVAL):
+        self.interval = interval
+        # True/False 为最近一次确定的校验结果，None 表示尚未校验或无法判断
+        self.valid: bool | None = None
+        self.checked_at: float = 0.0
+        self.avoided_attempts = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._refresh_task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> bool | None:
+        async with self._lock:
+            try:
+                await utils.check_cookie_valid()
+            except Exception as e:
+                logger.warning(f"B站 Cookie 健康检查失败: {e}")
+                return self.valid
+            previous = self.valid
+            if utils.COOKIE_VALID is not None:
+                self.valid = utils.COOKIE_VALID
+                self.checked_at = time.time()
+            if self.valid != previous:
+                logger.info(f"B站 Cookie 状态更新: {previous} -> {self.valid}")
+            return self.valid
+
+    def refresh_soon(self) -> None:
+        """登录模式下载失败（可能是鉴权错误）后在后台重新校验。"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    def known_invalid(self) -> bool:
+        return self.valid is False
+
+    def record_avoided(self) -> None:
+        self.avoided_attempts += 1
+
+    def summary(self) -> str:
+        if not self.checked_at:
+            return "尚未完成后台校验"
+        checked = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.checked_at))
+        return (
+            f"最近校验: {checked}，已跳过 {self.avoided_attempts} 次注定失败的登录下载"
+        )
+
+
+COOKIE_HEALTH = CookieHealth()
@@ -1,13 +1,27 @@
 import asyncio
-import json
 import os
+import shutil
 import subprocess
+import uuid
 
-import aiofiles
+import httpx
 
 from astrbot.api import logger
 
-from .utils import map_quality_to_height
+from ..http_pool import get_http_client
+from .constants import (
+    DASH_CHUNK_SIZE,
+    DEFAULT_HEADERS,
+    FNVAL_MP4,
+)
+from .model import DEFAULT_CODEC_POLICY, BiliPlayInfo, BiliStream, CodecPolicy
+from .playurl import (
+    fetch_playurl,
+    pick_audio_stream,
+    pick_video_stream,
+)
+from .yutto_pool import YUTTO_POOL
+from .utils import get_cookie_snapshot, load_cookies, map_quality_to_height
 
 YUTTO_PATH = "/root/.local/bin/yutto"
 
@@ -26,30 +40,115 @@ def _yutto_cmd() -> str:
     return YUTTO_PATH if os.path.exists(YUTTO_PATH) else "yutto"
 
 
+class DownloadSizeExceeded(Exception):
+    """下载过程中体积已超出预算，调用方应直接尝试更低清晰度。"""
+
+    def __init__(self, size_bytes: int, max_bytes: int):
+        self.size_bytes = size_bytes
+        self.max_bytes = max_bytes
+        super().__init__(
+            f"下载体积 {size_bytes / 1024 / 1024:.2f}MB 已超出限制 "
+            f"{max_bytes / 1024 / 1024:.2f}MB，已中止"
+        )
+
+
+def _job_name(bvid: str) -> str:
+    """
+    单次下载使用的文件名前缀 {bvid}.{随机串}。同一视频的并发下载各自写入
+    独立的临时文件与成品，清理时也不会删到其他任务的文件。
+    """
+    return f"{bvid}.{uuid.uuid4().hex[:8]}"
+
+
+def _yutto_files(download_dir: str, name: str) -> list[os.DirEntry]:
+    """yutto 的输出文件：{name}.mp4 及 {name}*.m4s 流文件。"""
+    try:
+        return [
+            entry
+            for entry in os.scandir(download_dir)
+            if entry.is_file()
+            and (
+                entry.name == f"{name}.mp4"
+                or (entry.name.startswith(name) and entry.name.endswith(".m4s"))
+            )
+        ]
+    except OSError:
+        return []
+
+
+def _yutto_progress(download_dir: str, name: str) -> tuple[int, int]:
+    """返回 (全部输出文件字节数, 其中 .m4s 流文件字节数)。"""
+    total = streams = 0
+    for entry in _yutto_files(download_dir, name):
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            continue
+        total += size
+        if entry.name.endswith(".m4s"):
+            streams += size
+    return total, streams
+
+
+async def _run_yutto(
+    args: list[str],
+    name: str,
+    download_dir: str,
+    num_workers: int = 8,
+    max_bytes: int | None = None,
+    error_prefix: str = "yutto 下载失败",
+) -> str:
+    """
+    经 YUTTO_POOL 排队运行 yutto，并监控输出目录：流文件总量超出 max_bytes
+    时立即结束进程，而不是等整个超限文件下载完成。
+    """
+    output_path = os.path.join(download_dir, f"{name}.mp4")
+
+    def build_cmd(workers: int) -> list[str]:
+        return [*args, "-n", str(workers)]
+
+    def monitor() -> tuple[int, Exception | None]:
+        total, streams = _yutto_progress(download_dir, name)
+        if max_bytes and streams > max_bytes:
+            return total, DownloadSizeExceeded(streams, max_bytes)
+        return total, None
+
+    try:
+        returncode, output = await YUTTO_POOL.run(build_cmd, num_workers, monitor)
+    except BaseException:
+        _remove_quietly(*(e.path for e in _yutto_files(download_dir, name)))
+        raise
+
+    if returncode != 0:
+        raise Exception(f"{error_prefix}: {output[-500:]}")
+
+    if os.path.exists(output_path):
+        os.utime(output_path, None)
+        return output_path
+
+    raise Exception("yutto 运行成功但未生成文件")
+
+
 async def download_video_yutto(
     bvid: str,
-    cookies_file: str,
     download_dir: str,
     quality: int = 80,
     num_workers: int = 8,
+    max_bytes: int | None = None,
+    vcodec: str = "avc",
 ) -> str:
     if not check_yutto_installed():
         raise Exception("yutto is not installed or not found in PATH.")
 
     os.makedirs(download_dir, exist_ok=True)
-    output_path = os.path.join(download_dir, f"{bvid}.mp4")
+    name = _job_name(bvid)
 
-    try:
-        async with aiofiles.open(cookies_file, "r", encoding="utf-8") as f:
-            json_cookies = json.loads(await f.read())
-            sessdata = json_cookies.get("SESSDATA")
-            if not sessdata:
-                raise ValueError("Cookie 文件中缺少 SESSDATA 字段。")
-    except Exception as e:
-        raise Exception(f"无法获取 SESSDATA Cookie: {e}")
-
-    if os.path.exists(output_path):
-        os.remove(output_path)
+    cookies = await load_cookies()
+    sessdata = (cookies or {}).get("SESSDATA")
+    if not sessdata:
+        raise Exception(
+            "无法获取 SESSDATA Cookie: Cookie 文件不存在或缺少 SESSDATA 字段。"
+        )
 
     quality_qn = map_quality_to_height(quality)
     yutto = _yutto_cmd()
@@ -63,38 +162,17 @@ async def download_video_yutto(
         download_dir,
         "-q",
         str(quality_qn),
-        "-n",
-        str(num_workers),
         "-w",
         "--no-color",
-        "--no-progress",
         "--subpath-template",
-        bvid,
+        name,
         "--no-danmaku",
         "--no-subtitle",
         "--no-cover",
+        "--vcodec",
+        f"{vcodec}:copy",
     ]
-
-    cmd_str = " ".join(cmd)
-    logger.debug(f"yutto CMD: {cmd_str[:200]}{'...' if len(cmd_str) > 200 else ''}")
-
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-
-    _, stderr_data = await process.communicate()
-
-    if process.returncode != 0:
-        error_output = stderr_data.decode(errors="ignore").strip()
-        raise Exception(f"yutto 下载失败: {error_output[:500]}")
-
-    if os.path.exists(output_path):
-        os.utime(output_path, None)
-        return output_path
-
-    raise Exception("yutto 运行成功但未生成文件")
+    return await _run_yutto(cmd, name, download_dir, num_workers, max_bytes)
 
 
 async def download_video_yutto_no_login(
@@ -102,15 +180,14 @@ async def download_video_yutto_no_login(
     download_dir: str,
     quality: int = 16,
     num_workers: int = 8,
+    max_bytes: int | None = None,
+    vcodec: str = "avc",
 ) -> str:
     if not check_yutto_installed():
         raise Exception("yutto is not installed or not found in PATH.")
 
     os.makedirs(download_dir, exist_ok=True)
-    output_path = os.path.join(download_dir, f"{bvid}.mp4")
-
-    if os.path.exists(output_path):
-        os.remove(output_path)
+    name = _job_name(bvid)
 
     quality_qn = map_quality_to_height(quality)
     yutto = _yutto_cmd()
@@ -122,37 +199,259 @@ async def download_video_yutto_no_login(
         download_dir,
         "-q",
         str(quality_qn),
-        "-n",
-        str(num_workers),
         "-w",
         "--no-color",
-        "--no-progress",
         "--subpath-template",
-        bvid,
+        name,
         "--no-danmaku",
         "--no-subtitle",
         "--no-cover",
+        "--vcodec",
+        f"{vcodec}:copy",
     ]
-
-    cmd_str = " ".join(cmd)
-    logger.debug(
-        f"yutto CMD (no login): {cmd_str[:200]}{'...' if len(cmd_str) > 200 else ''}"
+    return await _run_yutto(
+        cmd,
+        name,
+        download_dir,
+        num_workers,
+        max_bytes,
+        error_prefix="yutto 下载失败（无登录）",
     )
 
+
+def _remove_quietly(*paths: str) -> None:
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"删除临时文件失败 {path}: {e}")
+
+
+def _write_at(path: str, offset: int, data: bytes) -> None:
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+async def _probe_length(client: httpx.AsyncClient, url: str) -> int:
+    headers = {**DEFAULT_HEADERS, "Range": "bytes=0-0"}
+    async with client.stream("GET", url, headers=headers) as resp:
+        resp.raise_for_status()
+        content_range = resp.headers.get("Content-Range", "")
+        if "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            if total.isdigit():
+                return int(total)
+        return int(resp.headers.get("Content-Length", 0) or 0)
+
+
+async def _fetch_range(
+    client: httpx.AsyncClient,
+    urls: list[str],
+    dest: str,
+    start: int,
+    end: int,
+    retries: int = 3,
+) -> None:
+    last_error: Exception | None = None
+    for attempt in range(retries):
+        url = urls[attempt % len(urls)]
+        headers = {**DEFAULT_HEADERS, "Range": f"bytes={start}-{end}"}
+        try:
+            resp = await client.get(url, headers=headers, timeout=60)
+            resp.raise_for_status()
+            data = resp.content
+            if len(data) != end - start + 1:
+                raise ValueError(f"分段长度不符: {len(data)} != {end - start + 1}")
+            await asyncio.to_thread(_write_at, dest, start, data)
+            return
+        except Exception as e:
+            last_error = e
+            await asyncio.sleep(0.5 * (attempt + 1))
+    raise Exception(f"分段 {start}-{end} 下载失败: {last_error}")
+
+
+async def _stream_length(stream: BiliStream) -> int:
+    client = get_http_client()
+    for url in stream.urls:
+        try:
+            total = await _probe_length(client, url)
+            if total:
+                return total
+        except Exception as e:
+            logger.debug(f"B站 媒体流探测失败 {url[:80]}: {e}")
+    raise Exception(f"无法获取 {stream.kind} 流大小")
+
+
+async def _download_stream(
+    stream: BiliStream, dest: str, num_workers: int = 8, total: int = 0
+) -> int:
+    """按 Range 分段并发下载单条媒体流，返回字节数。"""
+    client = get_http_client()
+    urls = stream.urls
+    if not total:
+        total = await _stream_length(stream)
+
+    ranges = [
+        (start, min(start + DASH_CHUNK_SIZE, total) - 1)
+        for start in range(0, total, DASH_CHUNK_SIZE)
+    ]
+    semaphore = asyncio.Semaphore(max(1, num_workers))
+
+    async def worker(start: int, end: int) -> None:
+        async with semaphore:
+            await _fetch_range(client, urls, dest, start, end)
+
+    with open(dest, "wb") as f:
+        f.truncate(total)
+    await asyncio.gather(*(worker(start, end) for start, end in ranges))
+    return total
+
+
+async def _mux(video_path: str, audio_path: str | None, output_path: str) -> None:
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path]
+    if audio_path:
+        cmd += ["-i", audio_path]
+    # 直接输出 faststart 布局，发送前无需再重封装
+    cmd += ["-c", "copy", "-movflags", "+faststart", "-f", "mp4", output_path]
     process = await asyncio.create_subprocess_exec(
         *cmd,
-        stdout=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.DEVNULL,
         stderr=asyncio.subprocess.PIPE,
     )
-
     _, stderr_data = await process.communicate()
-
     if process.returncode != 0:
         error_output = stderr_data.decode(errors="ignore").strip()
-        raise Exception(f"yutto 下载失败（无登录）: {error_output[:500]}")
+        raise Exception(f"ffmpeg 合并失败: {error_output[:500]}")
 
-    if os.path.exists(output_path):
-        os.utime(output_path, None)
+
+async def download_video_native(
+    bvid: str,
+    cid: int,
+    download_dir: str,
+    quality: int = 80,
+    use_login: bool = True,
+    num_workers: int = 8,
+    play_info: BiliPlayInfo | None = None,
+    max_bytes: int | None = None,
+    codec_policy: CodecPolicy = DEFAULT_CODEC_POLICY,
+) -> str:
+    """
+    内置下载器：调用 playurl 获取流地址，经共享连接池分段并发下载
+    DASH 视频/音频轨后用 ffmpeg -c copy 合并；无 ffmpeg 时改用 durl MP4。
+
+    play_info 为调用方已获取的 DASH 信息时直接复用，不再请求 playurl。
+    下载前先探测各流大小，合计超出 max_bytes 时直接抛出 DownloadSizeExceeded。
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    name = _job_name(bvid)
+    output_path = os.path.join(download_dir, f"{name}.mp4")
+    part_path = f"{output_path}.part"
+    video_tmp = os.path.join(download_dir, f"{name}.video.m4s")
+    audio_tmp = os.path.join(download_dir, f"{name}.audio.m4s")
+
+    cookie = ""
+    if use_login:
+        cookie = (await get_cookie_snapshot()).header
+        if not cookie:
+            raise Exception("无法获取 B站 Cookie")
+
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    if has_ffmpeg:
+        if play_info is None or not play_info.is_dash:
+            play_info = await fetch_playurl(bvid, cid, quality, cookie)
+    else:
+        logger.debug("未找到 ffmpeg，使用 durl MP4 下载")
+        play_info = await fetch_playurl(bvid, cid, quality, cookie, fnval=FNVAL_MP4)
+
+    try:
+        if play_info.is_dash and has_ffmpeg:
+            video = pick_video_stream(play_info, quality, codec_policy)
+            audio = pick_audio_stream(play_info)
+            logger.debug(
+                f"内置下载器 {bvid}: 视频 {video.quality}/{video.codec}"
+                f"{'，音频 ' + str(audio.quality) if audio else '，无音频轨'}"
+            )
+            streams = [(video, video_tmp)]
+            if audio:
+                streams.append((audio, audio_tmp))
+            totals = await asyncio.gather(*(_stream_length(st) for st, _ in streams))
+            if max_bytes and sum(totals) > max_bytes:
+                raise DownloadSizeExceeded(sum(totals), max_bytes)
+            await asyncio.gather(
+                *(
+                    _download_stream(st, dest, num_workers, total)
+                    for (st, dest), total in zip(streams, totals)
+                )
+            )
+            await _mux(video_tmp, audio_tmp if audio else None, part_path)
+        elif len(play_info.durl) == 1:
+            logger.debug(
+                f"内置下载器 {bvid}: durl MP4 清晰度 {play_info.durl[0].quality}"
+            )
+            total = await _stream_length(play_info.durl[0])
+            if max_bytes and total > max_bytes:
+                raise DownloadSizeExceeded(total, max_bytes)
+            await _download_stream(play_info.durl[0], part_path, num_workers, total)
+        else:
+            raise Exception("playurl 未返回可用的 DASH 或单段 MP4 流")
+
+        os.replace(part_path, output_path)
         return output_path
+    finally:
+        _remove_quietly(video_tmp, audio_tmp, part_path)
 
-    raise Exception("yutto 运行成功但未生成文件")
+
+async def download_video(
+    bvid: str,
+    cid: int,
+    download_dir: str,
+    quality: int = 80,
+    use_login: bool = True,
+    backend: str = "native",
+    num_workers: int = 8,
+    play_info: BiliPlayInfo | None = None,
+    max_bytes: int | None = None,
+    codec_policy: CodecPolicy = DEFAULT_CODEC_POLICY,
+) -> str:
+    """按配置的后端下载；内置下载器失败时回退到 yutto（超出体积预算时不回退）。"""
+    if backend == "native":
+        try:
+            return await download_video_native(
+                bvid,
+                cid,
+                download_dir,
+                quality=quality,
+                use_login=use_login,
+                num_workers=num_workers,
+                play_info=play_info,
+                max_bytes=max_bytes,
+                codec_policy=codec_policy,
+            )
+        except DownloadSizeExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"内置下载器失败，回退到 yutto: {e}")
+
+    vcodec = codec_policy.preferred
+    stream = pick_video_stream(play_info, quality, codec_policy) if play_info else None
+    if stream:
+        vcodec = stream.codec
+    if use_login:
+        return await download_video_yutto(
+            bvid,
+            download_dir,
+            quality=quality,
+            num_workers=num_workers,
+            max_bytes=max_bytes,
+            vcodec=vcodec,
+        )
+    return await download_video_yutto_no_login(
+        bvid,
+        download_dir,
+        quality=quality,
+        num_workers=num_workers,
+        max_bytes=max_bytes,
+        vcodec=vcodec,
+    )
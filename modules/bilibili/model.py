@@ -8,6 +8,8 @@ class BiliVideoInfo:
         cover: str,
         duration: int,
         stats: dict,
+        tid: int = 0,
+        tname: str = "",
     ):
         self.aid = aid
         self.cid = cid
@@ -16,6 +18,8 @@ class BiliVideoInfo:
         self.cover = cover
         self.duration = duration
         self.stats = stats
+        self.tid = tid
+        self.tname = tname
 
     def to_dict(self) -> dict:
         return {
@@ -26,4 +30,78 @@ class BiliVideoInfo:
             "cover": self.cover,
             "duration": self.duration,
             "stats": self.stats,
+            "tid": self.tid,
+            "tname": self.tname,
         }
+
+
+class BiliStream:
+    """playurl 返回的单条媒体流（DASH 视频/音频轨，或 durl 整段 MP4）。"""
+
+    def __init__(
+        self,
+        kind: str,
+        quality: int,
+        url: str,
+        backup_urls: list[str] | None = None,
+        codec: str = "",
+        bandwidth: int = 0,
+        size: int = 0,
+        width: int = 0,
+        height: int = 0,
+    ):
+        self.kind = kind  # video / audio / durl
+        self.quality = quality
+        self.url = url
+        self.backup_urls = backup_urls or []
+        self.codec = codec
+        self.bandwidth = bandwidth
+        self.size = size
+        self.width = width
+        self.height = height
+
+    @property
+    def urls(self) -> list[str]:
+        return [self.url, *self.backup_urls]
+
+
+class BiliPlayInfo:
+    def __init__(
+        self,
+        duration: float,
+        video: list[BiliStream] | None = None,
+        audio: list[BiliStream] | None = None,
+        durl: list[BiliStream] | None = None,
+        accept_quality: list[int] | None = None,
+    ):
+        self.duration = duration
+        self.video = video or []
+        self.audio = audio or []
+        self.durl = durl or []
+        self.accept_quality = accept_quality or []
+
+    @property
+    def is_dash(self) -> bool:
+        return bool(self.video)
+
+
+class CodecPolicy:
+    """
+    视频编码选择策略。
+
+    codecs 为允许的编码，按客户端兼容性从高到低排列；smallest 为 True 时
+    同一清晰度下选体积最小的允许编码，否则按 codecs 顺序优先。
+    """
+
+    def __init__(
+        self, codecs: list[str] | tuple[str, ...] = ("avc",), smallest: bool = False
+    ):
+        self.codecs = tuple(c for c in codecs if c) or ("avc",)
+        self.smallest = smallest
+
+    @property
+    def preferred(self) -> str:
+        return self.codecs[0]
+
+
+DEFAULT_CODEC_POLICY = CodecPolicy()
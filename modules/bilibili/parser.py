@@ -1,6 +1,6 @@
+import asyncio
 import re
-
-import aiohttp
+import time
 
 from astrbot.api import logger
 
@@ -12,7 +12,15 @@ from .constants import (
     REG_BILI_SPACE,
     API_BY_AID,
     API_BY_BVID,
+    BV_ALPHABET,
+    BV_BASE,
+    BV_MASK_CODE,
+    BV_MAX_AID,
+    BV_XOR_CODE,
+    VIEW_CACHE_SIZE,
+    VIEW_CACHE_TTL,
 )
+from ..short_link import SHORT_LINKS
 from .model import BiliVideoInfo
 from .utils import bili_request, format_number
 
@@ -21,6 +29,20 @@ class UnsupportedBiliLinkError(Exception):
     pass
 
 
+# view 接口结果缓存与进行中的请求（同一视频并发解析只请求一次）
+_VIEW_CACHE: dict[str, tuple[float, BiliVideoInfo]] = {}
+_VIEW_INFLIGHT: dict[str, asyncio.Future] = {}
+
+
+# BV 号前缀大小写不敏感（"bv1..." 视为 "BV1..."），其后 9 位区分大小写
+_REG_BV_ANY_CASE = re.compile(r"[Bb][Vv]1\w{9}")
+
+
+def _find_bvid(ref: str) -> str | None:
+    match = _REG_BV_ANY_CASE.search(str(ref or ""))
+    return f"BV{match.group(0)[2:]}" if match else None
+
+
 def _extract_aid(raw: str) -> str | None:
     s = str(raw or "").strip().lower()
     if not s.startswith("av"):
@@ -29,12 +51,86 @@ def _extract_aid(raw: str) -> str | None:
     return m.group(0) if m else None
 
 
-def av2bv(av: str) -> str | None:
-    match = REG_AV.search(str(av or ""))
-    return match.group(0) if match else None
+def _swap_bv_chars(chars: list[str]) -> list[str]:
+    chars[3], chars[9] = chars[9], chars[3]
+    chars[4], chars[7] = chars[7], chars[4]
+    return chars
+
+
+def av2bv(av: str | int) -> str | None:
+    """av 号（"av170001" 或整数）离线转换为 BV 号，无法转换时返回 None。"""
+    aid = int(av) if isinstance(av, int) else int(_extract_aid(av) or 0)
+    if not 0 < aid < BV_MAX_AID:
+        return None
+    chars = list("BV1000000000")
+    tmp = (BV_MAX_AID | aid) ^ BV_XOR_CODE
+    index = len(chars) - 1
+    while tmp > 0:
+        chars[index] = BV_ALPHABET[tmp % BV_BASE]
+        tmp //= BV_BASE
+        index -= 1
+    return "".join(_swap_bv_chars(chars))
+
+
+def bv2av(bvid: str) -> int | None:
+    """BV 号离线转换为 aid，格式不正确时返回 None。"""
+    canonical = _find_bvid(bvid)
+    if not canonical:
+        return None
+    chars = _swap_bv_chars(list(canonical))
+    tmp = 0
+    for char in chars[3:]:
+        index = BV_ALPHABET.find(char)
+        if index < 0:
+            return None
+        tmp = tmp * BV_BASE + index
+    return (tmp & BV_MASK_CODE) ^ BV_XOR_CODE
+
+
+def normalize_bvid(ref: str | int) -> str | None:
+    """将 av 号 / BV 号 / 含视频号的链接统一为规范 BV 号，作为缓存等查找的键。"""
+    if isinstance(ref, int):
+        return av2bv(ref)
+    canonical = _find_bvid(ref)
+    if canonical:
+        return canonical
+    match = REG_AV.search(str(ref or ""))
+    return av2bv(match.group(0)) if match else None
+
+
+def _view_cache_put(info: BiliVideoInfo) -> None:
+    now = time.monotonic()
+    for key in [k for k, (ts, _) in _VIEW_CACHE.items() if now - ts > VIEW_CACHE_TTL]:
+        del _VIEW_CACHE[key]
+    while len(_VIEW_CACHE) >= VIEW_CACHE_SIZE:
+        del _VIEW_CACHE[next(iter(_VIEW_CACHE))]
+    _VIEW_CACHE[info.bvid] = (now, info)
 
 
 async def parse_video(bvid: str) -> BiliVideoInfo | None:
+    """按 BV 号或 av 号获取视频信息；结果按 VIEW_CACHE_TTL 缓存，并发请求合并为一次。"""
+    key = normalize_bvid(bvid) or str(bvid or "").strip()
+    cached = _VIEW_CACHE.get(key)
+    if cached and time.monotonic() - cached[0] <= VIEW_CACHE_TTL:
+        logger.debug(f"B站 视频信息缓存命中: {key}")
+        return cached[1]
+
+    inflight = _VIEW_INFLIGHT.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    task = asyncio.ensure_future(_fetch_video(key))
+    _VIEW_INFLIGHT[key] = task
+    try:
+        info = await asyncio.shield(task)
+    finally:
+        _VIEW_INFLIGHT.pop(key, None)
+    if info:
+        _view_cache_put(info)
+    return info
+
+
+async def _fetch_video(bvid: str) -> BiliVideoInfo | None:
     if REG_AV.search(str(bvid or "")):
         aid = _extract_aid(bvid)
         api_url = API_BY_AID.format(aid)
@@ -66,43 +162,27 @@ async def parse_video(bvid: str) -> BiliVideoInfo | None:
         cover=info["pic"],
         duration=info["duration"],
         stats=stats,
+        tid=info.get("tid", 0) or 0,
+        tname=info.get("tname", "") or "",
     )
 
 
 async def parse_b23(short_url: str) -> BiliVideoInfo | None:
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.head(
-                f"https://{short_url}", allow_redirects=True
-            ) as response:
-                real_url = str(response.url)
-                if REG_BILI_LIVE.search(real_url):
-                    logger.debug(
-                        f"短链解析到 Bilibili 直播间，不支持解析下载: {real_url}"
-                    )
-                    raise UnsupportedBiliLinkError(
-                        "该链接为 Bilibili 直播间，当前不支持解析下载"
-                    )
-                if REG_BILI_DYNAMIC.search(real_url):
-                    logger.debug(
-                        f"短链解析到 Bilibili 动态，不支持解析下载: {real_url}"
-                    )
-                    raise UnsupportedBiliLinkError(
-                        "该链接为 Bilibili 动态，当前不支持解析下载"
-                    )
-                if REG_BILI_SPACE.search(real_url):
-                    logger.debug(
-                        f"短链解析到 Bilibili 个人空间，不支持解析下载: {real_url}"
-                    )
-                    raise UnsupportedBiliLinkError(
-                        "该链接为 Bilibili 个人空间，当前不支持解析下载"
-                    )
-
-                if REG_BV.search(real_url):
-                    return await parse_video(REG_BV.search(real_url).group())
-                if REG_AV.search(real_url):
-                    return await parse_video(av2bv(REG_AV.search(real_url).group()))
-                return None
-    except aiohttp.ClientError as e:
-        logger.warning(f"B23 短链解析网络错误: {e}")
+    real_url = await SHORT_LINKS.resolve(short_url)
+    if not real_url:
         return None
+    if REG_BILI_LIVE.search(real_url):
+        logger.debug(f"短链解析到 Bilibili 直播间，不支持解析下载: {real_url}")
+        raise UnsupportedBiliLinkError("该链接为 Bilibili 直播间，当前不支持解析下载")
+    if REG_BILI_DYNAMIC.search(real_url):
+        logger.debug(f"短链解析到 Bilibili 动态，不支持解析下载: {real_url}")
+        raise UnsupportedBiliLinkError("该链接为 Bilibili 动态，当前不支持解析下载")
+    if REG_BILI_SPACE.search(real_url):
+        logger.debug(f"短链解析到 Bilibili 个人空间，不支持解析下载: {real_url}")
+        raise UnsupportedBiliLinkError("该链接为 Bilibili 个人空间，当前不支持解析下载")
+
+    if REG_BV.search(real_url):
+        return await parse_video(REG_BV.search(real_url).group())
+    if REG_AV.search(real_url):
+        return await parse_video(REG_AV.search(real_url).group())
+    return None
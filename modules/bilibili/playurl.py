@@ -0,0 +1,218 @@
+from astrbot.api import logger
+
+from ..http_pool import get_http_client
+from .constants import (
+    API_PLAYURL,
+    CODEC_NAMES,
+    DEFAULT_HEADERS,
+    FNVAL_DASH,
+)
+from .model import DEFAULT_CODEC_POLICY, BiliPlayInfo, BiliStream, CodecPolicy
+from .utils import get_cookie_snapshot
+
+
+class PlayurlError(Exception):
+    def __init__(self, msg: str, code: int = 0):
+        self.msg = msg
+        self.code = code
+        super().__init__(msg)
+
+
+def _stream_urls(item: dict) -> tuple[str, list[str]]:
+    url = item.get("baseUrl") or item.get("base_url") or item.get("url") or ""
+    backups = item.get("backupUrl") or item.get("backup_url") or []
+    return url, [u for u in backups if isinstance(u, str) and u]
+
+
+def parse_playurl(data: dict) -> BiliPlayInfo:
+    duration = (data.get("timelength") or 0) / 1000
+    dash = data.get("dash") or {}
+    if dash.get("duration"):
+        duration = float(dash["duration"])
+
+    video: list[BiliStream] = []
+    for item in dash.get("video") or []:
+        url, backups = _stream_urls(item)
+        if not url:
+            continue
+        video.append(
+            BiliStream(
+                kind="video",
+                quality=int(item.get("id", 0)),
+                url=url,
+                backup_urls=backups,
+                codec=CODEC_NAMES.get(item.get("codecid"), str(item.get("codecid"))),
+                bandwidth=int(item.get("bandwidth", 0) or 0),
+                size=int(item.get("size", 0) or 0),
+                width=int(item.get("width", 0) or 0),
+                height=int(item.get("height", 0) or 0),
+            )
+        )
+
+    audio: list[BiliStream] = []
+    for item in dash.get("audio") or []:
+        url, backups = _stream_urls(item)
+        if not url:
+            continue
+        audio.append(
+            BiliStream(
+                kind="audio",
+                quality=int(item.get("id", 0)),
+                url=url,
+                backup_urls=backups,
+                codec=item.get("codecs", ""),
+                bandwidth=int(item.get("bandwidth", 0) or 0),
+                size=int(item.get("size", 0) or 0),
+            )
+        )
+
+    durl: list[BiliStream] = []
+    for item in data.get("durl") or []:
+        url, backups = _stream_urls(item)
+        if not url:
+            continue
+        durl.append(
+            BiliStream(
+                kind="durl",
+                quality=int(data.get("quality", 0) or 0),
+                url=url,
+                backup_urls=backups,
+                codec="avc",
+                size=int(item.get("size", 0) or 0),
+            )
+        )
+
+    return BiliPlayInfo(
+        duration=duration,
+        video=video,
+        audio=audio,
+        durl=durl,
+        accept_quality=[int(q) for q in data.get("accept_quality") or []],
+    )
+
+
+async def fetch_playurl(
+    bvid: str,
+    cid: int,
+    quality: int = 127,
+    cookie: str = "",
+    fnval: int = FNVAL_DASH,
+) -> BiliPlayInfo:
+    params = {
+        "bvid": bvid,
+        "cid": cid,
+        "qn": quality,
+        "fnval": fnval,
+        "fnver": 0,
+        "fourk": 1,
+    }
+    headers = dict(DEFAULT_HEADERS)
+    if cookie:
+        headers["Cookie"] = cookie
+
+    client = get_http_client()
+    resp = await client.get(API_PLAYURL, params=params, headers=headers, timeout=15)
+    resp.raise_for_status()
+    payload = resp.json()
+    code = payload.get("code", -1)
+    if code != 0:
+        raise PlayurlError(
+            f"playurl 返回错误: code={code}, message={payload.get('message', '')}",
+            code=code,
+        )
+
+    info = parse_playurl(payload.get("data") or {})
+    logger.debug(
+        f"playurl {bvid}: dash={len(info.video)} 视频轨/{len(info.audio)} 音频轨，"
+        f"durl={len(info.durl)}，可用清晰度={info.accept_quality}"
+    )
+    return info
+
+
+def pick_video_stream(
+    info: BiliPlayInfo, quality: int, policy: CodecPolicy = DEFAULT_CODEC_POLICY
+) -> BiliStream | None:
+    """取不高于 quality 的最高清晰度视频轨，同清晰度内按编码策略选择。
+
+    没有任何允许编码的视频轨时退回到全部视频轨。
+    """
+    streams = [s for s in info.video if s.codec in policy.codecs] or info.video
+    if not streams:
+        return None
+    candidates = [s for s in streams if s.quality <= quality]
+    if not candidates:
+        lowest = min(s.quality for s in streams)
+        candidates = [s for s in streams if s.quality == lowest]
+
+    def rank(stream: BiliStream) -> tuple:
+        codec_rank = (
+            policy.codecs.index(stream.codec)
+            if stream.codec in policy.codecs
+            else len(policy.codecs)
+        )
+        size = stream.size or stream.bandwidth
+        if policy.smallest:
+            return (-stream.quality, size, codec_rank)
+        return (-stream.quality, codec_rank, size)
+
+    return min(candidates, key=rank)
+
+
+def pick_audio_stream(info: BiliPlayInfo) -> BiliStream | None:
+    if not info.audio:
+        return None
+    return max(info.audio, key=lambda s: s.bandwidth)
+
+
+async def fetch_play_info(
+    bvid: str, cid: int, use_login: bool = True
+) -> BiliPlayInfo | None:
+    """获取全部清晰度的 DASH 流信息，失败时返回 None（交由调用方回退到预估）。"""
+    cookie = (await get_cookie_snapshot()).header if use_login else ""
+    try:
+        return await fetch_playurl(bvid, cid, 127, cookie)
+    except Exception as e:
+        logger.warning(f"获取 B站 playurl 失败，将使用预估码率: {e}")
+        return None
+
+
+def expected_sizes(
+    info: BiliPlayInfo, policy: CodecPolicy = DEFAULT_CODEC_POLICY
+) -> dict[int, float]:
+    """按清晰度计算下载后的预期体积（MB）：视频轨 + 最佳音频轨。"""
+    audio = pick_audio_stream(info)
+    audio_bytes = 0.0
+    if audio:
+        audio_bytes = audio.size or audio.bandwidth * info.duration / 8
+
+    sizes: dict[int, float] = {}
+    for quality in sorted({s.quality for s in info.video}):
+        video = pick_video_stream(info, quality, policy)
+        if not video or video.quality != quality:
+            continue
+        video_bytes = video.size or video.bandwidth * info.duration / 8
+        if not video_bytes:
+            continue
+        sizes[quality] = (video_bytes + audio_bytes) / (1024 * 1024)
+    return sizes
+
+
+def plan_quality(
+    info: BiliPlayInfo,
+    max_quality: int,
+    max_size_mb: float,
+    policy: CodecPolicy = DEFAULT_CODEC_POLICY,
+) -> tuple[int, float] | None:
+    """选出不高于 max_quality 且预期体积不超过 max_size_mb 的最高清晰度。
+
+    均不满足时返回最低清晰度；没有可用的码率信息时返回 None。
+    """
+    sizes = expected_sizes(info, policy)
+    if not sizes:
+        return None
+    allowed = {q: mb for q, mb in sizes.items() if q <= max_quality} or {
+        min(sizes): sizes[min(sizes)]
+    }
+    fitting = [q for q, mb in allowed.items() if mb <= max_size_mb]
+    quality = max(fitting) if fitting else min(allowed)
+    return quality, allowed[quality]
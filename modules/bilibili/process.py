@@ -1,11 +1,63 @@
+import asyncio
 import os
+import weakref
 
 from astrbot.api import logger
 
 from .constants import REG_B23, REG_BV, REG_AV
 from .parser import parse_b23, parse_video, av2bv, UnsupportedBiliLinkError
-from .download import download_video_yutto, download_video_yutto_no_login
-from . import utils
+from .download import DownloadSizeExceeded, download_video
+from .bitrate import get_bitrate_store
+from .cache import find_cached, store_cached
+from .cookie_health import COOKIE_HEALTH
+from .model import DEFAULT_CODEC_POLICY, BiliPlayInfo, BiliVideoInfo, CodecPolicy
+from .playurl import pick_video_stream
+
+
+# (bvid, cid) -> 锁，不再被持有或等待时自动释放
+_VIDEO_LOCKS: "weakref.WeakValueDictionary[tuple[str, int], asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _video_lock(bvid: str, cid: int) -> asyncio.Lock:
+    lock = _VIDEO_LOCKS.get((bvid, cid))
+    if lock is None:
+        lock = asyncio.Lock()
+        _VIDEO_LOCKS[(bvid, cid)] = lock
+    return lock
+
+
+def _resolve_stream(
+    quality: int, play_info: BiliPlayInfo | None, policy: CodecPolicy
+) -> tuple[int, str]:
+    """根据 playurl 信息推断实际下载到的清晰度与编码。"""
+    if play_info and play_info.video:
+        stream = pick_video_stream(play_info, quality, policy)
+        return stream.quality, stream.codec
+    return quality, policy.preferred
+
+
+async def _record_bitrate(
+    filename: str,
+    quality: int,
+    codec: str,
+    video_info: BiliVideoInfo,
+) -> None:
+    """记录本次下载的实际码率，供 estimate_size 校准。"""
+    store = get_bitrate_store()
+    if not store or not filename or not os.path.exists(filename):
+        return
+    try:
+        await store.record(
+            quality,
+            video_info.duration,
+            os.path.getsize(filename),
+            codec=codec,
+            category=video_info.tname,
+        )
+    except Exception as e:
+        logger.warning(f"记录 B站 码率失败: {e}")
 
 
 async def process_bili_video(
@@ -15,26 +67,37 @@ async def process_bili_video(
     use_login: bool = True,
     event=None,
     download_dir: str | None = None,
+    backend: str = "native",
+    play_info: BiliPlayInfo | None = None,
+    max_size_mb: float | None = None,
+    video_info: BiliVideoInfo | None = None,
+    codec_policy: CodecPolicy = DEFAULT_CODEC_POLICY,
 ) -> dict:
+    """
+    下载 B站 视频。调用方已解析过视频信息时通过 video_info 传入，避免重复请求。
+    """
     logger.debug(f"开始处理 B站 链接: {url}")
+    max_bytes = None
+    if max_size_mb and max_size_mb != float("inf"):
+        max_bytes = int(max_size_mb * 1024 * 1024)
 
-    video_info = None
-    try:
-        if REG_B23.search(url):
-            video_info = await parse_b23(REG_B23.search(url).group())
-        elif REG_BV.search(url):
-            video_info = await parse_video(REG_BV.search(url).group())
-        elif REG_AV.search(url):
-            bvid = av2bv(REG_AV.search(url).group())
-            video_info = await parse_video(bvid) if bvid else None
-        else:
-            logger.warning("不支持的链接格式")
-            return {"error": "不支持的链接格式"}
-    except UnsupportedBiliLinkError as e:
-        return {"error": str(e)}
-    except Exception as e:
-        logger.error(f"解析链接时发生错误: {e}")
-        return {"error": f"解析链接时发生错误: {e}"}
+    if video_info is None:
+        try:
+            if REG_B23.search(url):
+                video_info = await parse_b23(REG_B23.search(url).group())
+            elif REG_BV.search(url):
+                video_info = await parse_video(REG_BV.search(url).group())
+            elif REG_AV.search(url):
+                bvid = av2bv(REG_AV.search(url).group())
+                video_info = await parse_video(bvid) if bvid else None
+            else:
+                logger.warning("不支持的链接格式")
+                return {"error": "不支持的链接格式"}
+        except UnsupportedBiliLinkError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            logger.error(f"解析链接时发生错误: {e}")
+            return {"error": f"解析链接时发生错误: {e}"}
 
     if not video_info:
         logger.warning("解析视频信息失败")
@@ -46,73 +109,160 @@ async def process_bili_video(
     if download_dir is None:
         download_dir = "data/plugins/astrbot_plugin_video_analysis/downloads/bili"
 
-    cookies_file = utils.COOKIE_FILE
+    if use_login and COOKIE_HEALTH.known_invalid():
+        logger.info("B站 Cookie 已失效，跳过登录下载，直接使用 360p 免登录模式")
+        COOKIE_HEALTH.record_avoided()
+        use_login = False
+
+    # 同一视频的查找、下载与写入缓存串行执行：后到的请求等前一个完成后直接命中缓存，
+    # 也避免并发写入同一缓存文件
+    async with _video_lock(bvid, video_info.cid):
+        # 缓存按实际下载到的清晰度命名，查找时也要按实际能拿到的清晰度比较：
+        # 有 playurl 信息时以本次会选中的视频轨为下限；没有时只能把请求清晰度当作上限
+        requested = quality if use_login else 16
+        if use_login and play_info and play_info.video:
+            min_quality, _ = _resolve_stream(quality, play_info, codec_policy)
+            max_quality = None
+        else:
+            min_quality, max_quality = 0, requested
+        cached = find_cached(
+            download_dir,
+            bvid,
+            video_info.cid,
+            min_quality=min_quality,
+            max_bytes=max_bytes,
+            codecs=codec_policy.codecs,
+            max_quality=max_quality,
+        )
+        if cached:
+            logger.info(
+                f"本地已存在视频文件：{cached.path}（清晰度 {cached.quality}），跳过下载"
+            )
+            return {
+                "video_path": cached.path,
+                "title": video_info.title,
+                "cover": video_info.cover,
+                "duration": video_info.duration,
+                "stats": stats,
+                "bvid": bvid,
+                "quality": cached.quality,
+                "tname": video_info.tname,
+                "from_cache": True,
+                "view_count": stats["view"],
+                "like_count": stats["like"],
+                "danmaku_count": stats["danmaku"],
+                "coin_count": stats["coin"],
+                "favorite_count": stats["favorite"],
+            }
+
+        filename = None
+        downloaded_quality = quality
+        if download_flag:
+            if use_login:
+                logger.debug(f"开始下载 (需登录凭证，后端: {backend})...")
+                try:
+                    filename = await download_video(
+                        bvid,
+                        video_info.cid,
+                        download_dir,
+                        quality=quality,
+                        use_login=True,
+                        backend=backend,
+                        num_workers=8,
+                        play_info=play_info,
+                        max_bytes=max_bytes,
+                        codec_policy=codec_policy,
+                    )
+                except DownloadSizeExceeded as e:
+                    logger.warning(f"下载中止: {e}")
+                    return {"error": str(e), "size_exceeded": True}
+                except Exception as e:
+                    error_str = str(e)
+                    if "尚不支持 DASH 格式" in error_str:
+                        logger.warning(f"高清下载失败 (DASH 不支持)。错误: {e}")
+                        return {"error": f"下载失败: {e}"}
+
+                    logger.warning(f"高清下载失败: {e}")
+                    COOKIE_HEALTH.refresh_soon()
+                    logger.debug("尝试降级到 360p 无需登录模式...")
+                    try:
+                        filename = await download_video(
+                            bvid,
+                            video_info.cid,
+                            download_dir,
+                            quality=16,
+                            use_login=False,
+                            backend=backend,
+                            num_workers=8,
+                            max_bytes=max_bytes,
+                            codec_policy=codec_policy,
+                        )
+                        downloaded_quality = 16
+                        logger.debug(f"360p 降级下载成功: {filename}")
+                    except DownloadSizeExceeded as fallback_e:
+                        logger.warning(f"360p 降级下载中止: {fallback_e}")
+                        return {"error": str(fallback_e), "size_exceeded": True}
+                    except Exception as fallback_e:
+                        logger.error(f"360p 降级下载也失败: {fallback_e}")
+                        return {"error": f"360p 降级下载也失败: {fallback_e}"}
+            else:
+                logger.debug("未启用登录，尝试下载 360p...")
+                downloaded_quality = 16
+                try:
+                    filename = await download_video(
+                        bvid,
+                        video_info.cid,
+                        download_dir,
+                        quality=16,
+                        use_login=False,
+                        backend=backend,
+                        num_workers=8,
+                        max_bytes=max_bytes,
+                        codec_policy=codec_policy,
+                    )
+                except DownloadSizeExceeded as e:
+                    logger.warning(f"下载中止: {e}")
+                    return {"error": str(e), "size_exceeded": True}
+                except Exception as e:
+                    logger.warning(f"360p 下载失败: {e}")
+                    return {"error": f"360p 下载失败: {e}"}
+
+        if not filename and download_flag:
+            logger.warning("下载失败，无法获取视频文件。")
+            return {"error": "下载失败，无法获取视频文件 (未知错误)"}
+
+        if filename:
+            downloaded_quality, codec = _resolve_stream(
+                downloaded_quality,
+                play_info if downloaded_quality == quality else None,
+                codec_policy,
+            )
+            await _record_bitrate(filename, downloaded_quality, codec, video_info)
+            try:
+                filename = store_cached(
+                    filename,
+                    download_dir,
+                    bvid,
+                    video_info.cid,
+                    downloaded_quality,
+                    codec,
+                    video_info.duration,
+                ).path
+            except OSError as e:
+                logger.warning(f"写入 B站 缓存记录失败: {e}")
 
-    cached_file = os.path.join(download_dir, f"{bvid}.mp4")
-    if os.path.exists(cached_file):
-        logger.info(f"本地已存在视频文件：{cached_file}，跳过下载")
         return {
-            "video_path": cached_file,
             "title": video_info.title,
             "cover": video_info.cover,
             "duration": video_info.duration,
             "stats": stats,
-            "bvid": bvid,
+            "video_path": filename,
+            "quality": downloaded_quality,
+            "tname": video_info.tname,
             "view_count": stats["view"],
             "like_count": stats["like"],
             "danmaku_count": stats["danmaku"],
             "coin_count": stats["coin"],
             "favorite_count": stats["favorite"],
+            "bvid": bvid,
         }
-
-    filename = None
-    if download_flag:
-        if use_login:
-            logger.debug("调用 yutto 进行下载 (需登录凭证)...")
-            try:
-                filename = await download_video_yutto(
-                    bvid, cookies_file, download_dir, quality=quality, num_workers=8
-                )
-            except Exception as e:
-                error_str = str(e)
-                if "尚不支持 DASH 格式" in error_str:
-                    logger.warning(f"yutto 高清下载失败 (DASH 不支持)。错误: {e}")
-                    return {"error": f"下载失败: {e}"}
-
-                logger.warning(f"yutto 高清下载失败: {e}")
-                logger.debug("尝试降级到 360p 无需登录模式...")
-                try:
-                    filename = await download_video_yutto_no_login(
-                        bvid, download_dir, quality=16, num_workers=8
-                    )
-                    logger.debug(f"360p 降级下载成功: {filename}")
-                except Exception as fallback_e:
-                    logger.error(f"360p 降级下载也失败: {fallback_e}")
-                    return {"error": f"360p 降级下载也失败: {fallback_e}"}
-        else:
-            logger.debug("未启用登录，尝试下载 360p...")
-            try:
-                filename = await download_video_yutto_no_login(
-                    bvid, download_dir, quality=16, num_workers=8
-                )
-            except Exception as e:
-                logger.warning(f"360p 下载失败: {e}")
-                return {"error": f"360p 下载失败: {e}"}
-
-    if not filename and download_flag:
-        logger.warning("下载失败，无法获取视频文件。")
-        return {"error": "下载失败，无法获取视频文件 (未知错误)"}
-
-    return {
-        "title": video_info.title,
-        "cover": video_info.cover,
-        "duration": video_info.duration,
-        "stats": stats,
-        "video_path": filename,
-        "view_count": stats["view"],
-        "like_count": stats["like"],
-        "danmaku_count": stats["danmaku"],
-        "coin_count": stats["coin"],
-        "favorite_count": stats["favorite"],
-        "bvid": bvid,
-    }
@@ -11,6 +11,8 @@ import qrcode
 
 from astrbot.api import logger
 
+from ..cookie_provider import CookieProvider, CookieSnapshot, EMPTY_COOKIE
+from .bitrate import get_bitrate_store, init_bitrate_store
 from .constants import (
     ESTIMATED_BITRATES_MBPS,
     DEFAULT_HEADERS,
@@ -19,17 +21,35 @@ from .constants import (
 
 COOKIE_FILE: str | None = None
 COOKIE_VALID: bool | None = None
+_COOKIE_PROVIDER: CookieProvider | None = None
 
 
 def init_bili_module(cookie_file_path: str):
-    global COOKIE_FILE
+    global COOKIE_FILE, _COOKIE_PROVIDER
     COOKIE_FILE = cookie_file_path
     os.makedirs(os.path.dirname(COOKIE_FILE), exist_ok=True)
+    _COOKIE_PROVIDER = CookieProvider(COOKIE_FILE, name="B站 Cookie")
+    init_bitrate_store(os.path.join(os.path.dirname(COOKIE_FILE), "bili_bitrates.json"))
     logger.debug(f"bilibili 模块已初始化，Cookie 路径: {COOKIE_FILE}")
 
 
-def estimate_size(quality_qn: int, duration_seconds: int) -> float:
-    bitrate_mbps = ESTIMATED_BITRATES_MBPS.get(quality_qn, 1.0)
+def estimate_size(
+    quality_qn: int,
+    duration_seconds: int,
+    category: str = "",
+    codec: str = "avc",
+    upper: bool = False,
+) -> float:
+    """
+    预估下载体积（MB）：优先使用该编码实际下载记录拟合的码率，样本不足时用固定常量。
+    upper 为 True 时使用拟合区间的上界，用于判断是否需要降级。
+    """
+    store = get_bitrate_store()
+    fitted = store.estimate(quality_qn, category, codec) if store else None
+    if fitted:
+        bitrate_mbps = fitted.high if upper else fitted.mbps
+    else:
+        bitrate_mbps = ESTIMATED_BITRATES_MBPS.get(quality_qn, 1.0)
     return (bitrate_mbps * duration_seconds) / 8
 
 
@@ -78,29 +98,25 @@ async def bili_request(url: str, return_json: bool = True):
         return {"code": -400, "message": "Request timeout"}
 
 
+async def get_cookie_snapshot() -> CookieSnapshot:
+    if _COOKIE_PROVIDER is None:
+        return EMPTY_COOKIE
+    return await _COOKIE_PROVIDER.get()
+
+
 async def load_cookies() -> dict | None:
-    if not COOKIE_FILE or not os.path.exists(COOKIE_FILE):
-        logger.warning(f"Cookie 文件不存在: {COOKIE_FILE}")
-        return None
-    try:
-        async with aiofiles.open(COOKIE_FILE, "r", encoding="utf-8") as f:
-            content = await f.read()
-        if not content.strip():
-            logger.warning("Cookie 文件为空")
-            return None
-        return json.loads(content)
-    except json.JSONDecodeError:
-        logger.error("Cookie 文件格式错误")
-        return None
-    except Exception as e:
-        logger.error(f"加载 Cookie 失败: {e}")
+    snapshot = await get_cookie_snapshot()
+    if not snapshot:
         return None
+    return dict(snapshot.cookies)
 
 
 async def save_cookies_dict(cookies: dict) -> bool:
     try:
         async with aiofiles.open(COOKIE_FILE, "w", encoding="utf-8") as f:
             await f.write(json.dumps(cookies, ensure_ascii=False, indent=2))
+        if _COOKIE_PROVIDER is not None:
+            _COOKIE_PROVIDER.invalidate()
         logger.info(f"Cookie 已保存到: {COOKIE_FILE}")
         return True
     except Exception as e:
@@ -109,11 +125,16 @@ async def save_cookies_dict(cookies: dict) -> bool:
 
 
 async def check_cookie_valid() -> bool:
+    """
+    校验 Cookie 是否有效。结果同时写入 COOKIE_VALID：
+    True/False 为确定结果，网络异常等无法判断时为 None。
+    """
     global COOKIE_VALID
     COOKIE_VALID = None
     cookies = await load_cookies()
     if not cookies:
         logger.debug("未找到 Cookie 文件或 Cookie 文件为空，需要登录")
+        COOKIE_VALID = False
         return False
 
     required_fields = {
@@ -124,12 +145,12 @@ async def check_cookie_valid() -> bool:
     for field, validator in required_fields.items():
         if field not in cookies or not validator(str(cookies[field])):
             logger.debug(f"Cookie 字段验证失败: {field}")
+            COOKIE_VALID = False
             return False
 
     url = "https://api.bilibili.com/x/member/web/account"
-    cookie_str = "; ".join(f"{k}={v}" for k, v in cookies.items())
     headers = dict(COOKIE_CHECK_HEADERS)
-    headers["Cookie"] = cookie_str
+    headers["Cookie"] = (await get_cookie_snapshot()).header
 
     try:
         async with aiohttp.ClientSession() as session:
@@ -139,9 +160,11 @@ async def check_cookie_valid() -> bool:
                 if data.get("code") == 0:
                     api_mid = str(data.get("data", {}).get("mid", ""))
                     cookie_mid = str(cookies.get("DedeUserID", ""))
-                    if api_mid == cookie_mid:
-                        COOKIE_VALID = True
-                        return True
+                    COOKIE_VALID = api_mid == cookie_mid
+                    return COOKIE_VALID
+                # -101 为未登录；其他错误码（如风控）无法判断 Cookie 状态
+                if data.get("code") == -101:
+                    COOKIE_VALID = False
                 return False
     except Exception as e:
         logger.warning(f"验证 Cookie 有效性时异常: {e}")
@@ -0,0 +1,209 @@
+"""
+yutto 子进程池
+
+- 限制同时运行的 yutto 进程数，超出的任务排队等待
+- 按当前负载分配每个任务的 -n 线程数，避免多任务时连接数成倍增长
+- 增量读取 stdout/stderr，解析进度条中的已下载量；只有该值或调用方提供的
+  下载字节数增长才算有进展，其余输出（如 0.00 B/s 的进度刷新）不算
+- 停滞或超过总时长时结束进程
+"""
+
+import asyncio
+import os
+import re
+import signal
+from typing import Callable
+
+from astrbot.api import logger
+
+from .constants import (
+    YUTTO_JOB_TIMEOUT,
+    YUTTO_MAX_JOBS,
+    YUTTO_POLL_INTERVAL,
+    YUTTO_STALL_TIMEOUT,
+    YUTTO_TOTAL_WORKERS,
+)
+
+# 仅保留输出末尾用于错误信息
+_OUTPUT_TAIL = 4096
+# 进度条按 \r 刷新，未遇到换行时最多缓存这么多字节
+_LINE_LIMIT = 4096
+_SIZE_UNITS = {
+    "B": 1,
+    "KB": 1000,
+    "MB": 1000**2,
+    "GB": 1000**3,
+    "KIB": 1024,
+    "MIB": 1024**2,
+    "GIB": 1024**3,
+}
+# yutto 进度条形如 "━━━━ 12.34 MiB/ 56.78 MiB 1.23 MiB/s ⚡"，取斜杠前的已下载量
+_PROGRESS_SIZE = re.compile(
+    r"([\d.]+)\s*([KMG]i?B|B)\s*/\s*[\d.]+\s*(?:[KMG]i?B|B)", re.IGNORECASE
+)
+_PROGRESS_PERCENT = re.compile(r"([\d.]+)\s*%")
+
+
+class YuttoJobError(Exception):
+    pass
+
+
+def _parse_progress(line: str) -> tuple[str, float] | None:
+    """从一行进度输出中取出 ("bytes", 已下载字节) 或 ("percent", 百分比)。"""
+    try:
+        if m := _PROGRESS_SIZE.search(line):
+            return "bytes", float(m.group(1)) * _SIZE_UNITS[m.group(2).upper()]
+        if m := _PROGRESS_PERCENT.search(line):
+            return "percent", float(m.group(1))
+    except ValueError:
+        pass
+    return None
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+class YuttoPool:
+    def __init__(
+        self,
+        max_jobs: int = YUTTO_MAX_JOBS,
+        total_workers: int = YUTTO_TOTAL_WORKERS,
+        stall_timeout: float = YUTTO_STALL_TIMEOUT,
+        job_timeout: float = YUTTO_JOB_TIMEOUT,
+    ):
+        self.max_jobs = max(1, max_jobs)
+        self.total_workers = max(1, total_workers)
+        self.stall_timeout = stall_timeout
+        self.job_timeout = job_timeout
+        self._slots = asyncio.Semaphore(self.max_jobs)
+        self.active = 0
+        self.waiting = 0
+
+    def _workers_for_job(self, requested: int) -> int:
+        share = self.total_workers // max(1, self.active + self.waiting)
+        return max(1, min(requested, share))
+
+    async def run(
+        self,
+        build_cmd: Callable[[int], list[str]],
+        num_workers: int = 8,
+        monitor: Callable[[], tuple[int, Exception | None]] | None = None,
+    ) -> tuple[int, str]:
+        """
+        排队运行一个 yutto 任务，返回 (returncode, 输出末尾)。
+
+        build_cmd 接收分配到的线程数并返回完整命令；monitor 返回
+        (已下载字节数, 需要中止时的异常)，在每个轮询周期调用。
+        """
+        self.waiting += 1
+        if self._slots.locked():
+            logger.debug(
+                f"yutto 任务排队中（运行 {self.active}/{self.max_jobs}，等待 {self.waiting}）"
+            )
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            workers = self._workers_for_job(num_workers)
+            cmd = build_cmd(workers)
+            cmd_str = " ".join(cmd)
+            logger.debug(
+                f"yutto CMD (线程 {workers}): {cmd_str[:200]}{'...' if len(cmd_str) > 200 else ''}"
+            )
+            return await self._run_process(cmd, monitor)
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    async def _run_process(
+        self,
+        cmd: list[str],
+        monitor: Callable[[], tuple[int, Exception | None]] | None,
+    ) -> tuple[int, str]:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # 独立进程组，结束时连同 yutto 调起的 ffmpeg 一起结束
+            start_new_session=os.name == "posix",
+        )
+        loop = asyncio.get_running_loop()
+        started = last_activity = loop.time()
+        output = bytearray()
+        # 进度条中出现过的最大已下载量，只有增长时才刷新 last_activity
+        reported: dict[str, float] = {}
+
+        def on_line(line: bytes) -> None:
+            nonlocal last_activity
+            progress = _parse_progress(line.decode(errors="ignore"))
+            if not progress:
+                return
+            kind, value = progress
+            if value > reported.get(kind, -1):
+                reported[kind] = value
+                last_activity = loop.time()
+
+        async def pump(stream: asyncio.StreamReader) -> None:
+            pending = b""
+            while chunk := await stream.read(1024):
+                output.extend(chunk)
+                del output[:-_OUTPUT_TAIL]
+                *lines, pending = re.split(rb"[\r\n]", pending + chunk)
+                for line in lines:
+                    on_line(line)
+                pending = pending[-_LINE_LIMIT:]
+            if pending:
+                on_line(pending)
+
+        pumps = asyncio.gather(pump(process.stdout), pump(process.stderr))
+        waiter = asyncio.ensure_future(process.wait())
+        last_bytes = -1
+        abort: Exception | None = None
+        try:
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=YUTTO_POLL_INTERVAL)
+                if done:
+                    break
+                now = loop.time()
+                if monitor:
+                    progress, abort = monitor()
+                    if progress > last_bytes:
+                        last_bytes, last_activity = progress, now
+                    if abort:
+                        break
+                if now - last_activity > self.stall_timeout:
+                    abort = YuttoJobError(
+                        f"yutto 下载超过 {self.stall_timeout:.0f} 秒无进度，已中止"
+                    )
+                    break
+                if now - started > self.job_timeout:
+                    abort = YuttoJobError(
+                        f"yutto 下载超过 {self.job_timeout:.0f} 秒未完成，已中止"
+                    )
+                    break
+        finally:
+            if not waiter.done():
+                logger.warning(f"结束 yutto 进程: {abort or '任务被取消'}")
+                _kill(process)
+                await waiter
+            try:
+                await asyncio.wait_for(pumps, timeout=5)
+            except asyncio.TimeoutError:
+                pass
+
+        if abort:
+            raise abort
+        return process.returncode, output.decode(errors="ignore").strip()
+
+
+YUTTO_POOL = YuttoPool()
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Callable
+
+import aiofiles
+
+from astrbot.api import logger
+
+
+def parse_cookie_header(cookie_str: str) -> dict[str, str]:
+    """将 "k1=v1; k2=v2" 形式的 Cookie 字符串转为 dict。"""
+    if not cookie_str:
+        return {}
+    result = {}
+    for part in cookie_str.split(";"):
+        part = part.strip()
+        if "=" in part:
+            key, value = part.split("=", 1)
+            result[key.strip()] = value.strip()
+    return result
+
+
+def format_cookie_header(cookies: dict) -> str:
+    return "; ".join(f"{k}={v}" for k, v in cookies.items() if k and v)
+
+
+@dataclass(frozen=True)
+class CookieSnapshot:
+    """一次解析后的 Cookie：请求头字符串与 dict 两种形式。"""
+
+    header: str = ""
+    cookies: dict[str, str] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.header)
+
+    @classmethod
+    def from_header(cls, header: str) -> "CookieSnapshot":
+        return cls(header=header, cookies=parse_cookie_header(header))
+
+
+EMPTY_COOKIE = CookieSnapshot()
+
+
+class CookieProvider:
+    """
+    Cookie 内存缓存。
+
+    - override 非空时（如配置项中的 Cookie）始终使用它，不读文件
+    - 否则读取 JSON 格式的 Cookie 文件，按 mtime/大小判断是否需要重新加载
+    - formatter 可将文件中的 dict 转为最终使用的 Cookie 字符串
+    """
+
+    def __init__(
+        self,
+        file_path: str | None,
+        override: str = "",
+        formatter: Callable[[dict], str] | None = None,
+        name: str = "Cookie",
+    ):
+        self.file_path = file_path
+        self.name = name
+        self._formatter = formatter or format_cookie_header
+        self._override = CookieSnapshot.from_header(override) if override else None
+        self._snapshot = EMPTY_COOKIE
+        self._loaded_mtime: tuple[int, int] | None = None
+        self._lock = asyncio.Lock()
+
+    def _current_mtime(self) -> tuple[int, int] | None:
+        if not self.file_path:
+            return None
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def invalidate(self) -> None:
+        self._loaded_mtime = None
+
+    async def get(self) -> CookieSnapshot:
+        if self._override is not None:
+            return self._override
+
+        mtime = self._current_mtime()
+        if mtime is None:
+            if self._loaded_mtime is not None or self._snapshot:
+                logger.debug(f"{self.name} 文件不存在: {self.file_path}")
+            self._snapshot = EMPTY_COOKIE
+            self._loaded_mtime = None
+            return EMPTY_COOKIE
+        if mtime == self._loaded_mtime:
+            return self._snapshot
+
+        async with self._lock:
+            if mtime == self._loaded_mtime:
+                return self._snapshot
+            self._snapshot = await self._load()
+            self._loaded_mtime = mtime
+            logger.debug(
+                f"{self.name} 已从文件加载 ({len(self._snapshot.cookies)} 项): {self.file_path}"
+            )
+            return self._snapshot
+
+    async def _load(self) -> CookieSnapshot:
+        try:
+            async with aiofiles.open(self.file_path, "r", encoding="utf-8") as f:
+                content = await f.read()
+            if not content.strip():
+                logger.warning(f"{self.name} 文件为空: {self.file_path}")
+                return EMPTY_COOKIE
+            cookies = json.loads(content)
+            if not isinstance(cookies, dict) or not cookies:
+                return EMPTY_COOKIE
+            header = self._formatter(cookies)
+            if not header:
+                return EMPTY_COOKIE
+            return CookieSnapshot.from_header(header)
+        except json.JSONDecodeError:
+            logger.error(f"{self.name} 文件格式错误: {self.file_path}")
+        except Exception as e:
+            logger.error(f"加载 {self.name} 文件失败: {e}")
+        return EMPTY_COOKIE
@@ -7,6 +7,7 @@ from .parser import (
 )
 from .model import DouyinParseResult, VideoInfo
 from .download import DouyinDownloader
+from .strategies.share_page import configure_slides_batch
 
 __all__ = [
     "DouyinParser",
@@ -17,4 +18,5 @@ __all__ = [
     "get_effective_douyin_cookie",
     "format_douyin_failure_message",
     "send_douyin_with_title_forward",
+    "configure_slides_batch",
 ]
@@ -1,6 +1,7 @@
 # API 端点
 DOUYIN_DOMAIN = "https://www.douyin.com"
 POST_DETAIL = f"{DOUYIN_DOMAIN}/aweme/v1/web/aweme/detail/"
+SLIDES_INFO = "https://www.iesdouyin.com/web/api/v2/aweme/slidesinfo/"
 
 # 默认请求头（PC Web）
 PC_USER_AGENT = (
@@ -30,3 +31,7 @@ DOWNLOAD_HEADERS = {
 # 默认超时
 DEFAULT_TIMEOUT = 30
 DOWNLOAD_TIMEOUT = 300
+
+# slidesinfo 批量请求：收集窗口（秒）与单批最大 aweme_id 数
+SLIDES_BATCH_WINDOW = 0.2
+SLIDES_BATCH_SIZE = 10
@@ -6,6 +6,7 @@ import httpx
 
 from astrbot.api import logger
 
+from ..transcode import transcode_to_fit
 from .model import DouyinParseResult, _clean_video_url
 from .constants import DOWNLOAD_HEADERS, DOWNLOAD_TIMEOUT
 
@@ -17,11 +18,13 @@ class DouyinDownloader:
         max_images: int = 20,
         max_size: float = 200,
         smart_downgrade: bool = True,
+        transcode_oversize: bool = False,
     ):
         self.download_dir = download_dir
         self.max_images = max_images
         self.max_size = max_size
         self.smart_downgrade = smart_downgrade
+        self.transcode_oversize = transcode_oversize
 
     async def download(self, result: DouyinParseResult, url: str) -> dict:
         if not result.success:
@@ -169,6 +172,10 @@ class DouyinDownloader:
             reverse=True,
         )
 
+        # 启用转码时保留体积最小的超限文件，所有清晰度都超限时用于转码
+        oversize_file = f"{final_file}.oversize"
+        oversize_bytes = 0
+
         for br in sorted_rates:
             play_addr = br.get("play_addr", {})
             url_list = play_addr.get("url_list") or play_addr.get("urlList")
@@ -188,11 +195,21 @@ class DouyinDownloader:
                             async for chunk in resp.aiter_bytes():
                                 await f.write(chunk)
 
-                file_size_mb = os.path.getsize(final_file) / (1024 * 1024)
+                file_size = os.path.getsize(final_file)
+                file_size_mb = file_size / (1024 * 1024)
                 if file_size_mb > self.max_size and self.smart_downgrade:
-                    os.remove(final_file)
+                    if self.transcode_oversize and (
+                        not oversize_bytes or file_size < oversize_bytes
+                    ):
+                        os.replace(final_file, oversize_file)
+                        oversize_bytes = file_size
+                    else:
+                        os.remove(final_file)
                     continue
 
+                if oversize_bytes:
+                    os.remove(oversize_file)
+
                 return {
                     "title": title,
                     "author": author,
@@ -207,6 +224,23 @@ class DouyinDownloader:
                     os.remove(final_file)
                 continue
 
+        if oversize_bytes:
+            fitted = await transcode_to_fit(
+                oversize_file,
+                final_file,
+                int(self.max_size * 1024 * 1024),
+                duration,
+            )
+            os.remove(oversize_file)
+            if fitted:
+                return {
+                    "title": title,
+                    "author": author,
+                    "url": original_url,
+                    "video_path": fitted,
+                    "duration": duration,
+                }
+
         return None
 
     async def _download_file(self, url: str, save_path: str) -> bool:
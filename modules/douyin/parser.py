@@ -3,7 +3,7 @@
 
 职责：
 1. 编排策略链（Web API → 第三方 API）
-2. 管理 Cookie 源（配置 > 文件）
+2. 管理 Cookie 源（配置 > 文件，文件变更自动重新加载）
 3. 提供 parse() 统一入口
 """
 
@@ -11,8 +11,6 @@ import json
 import os
 from typing import Callable, Awaitable
 
-import aiofiles
-
 from astrbot.api import logger
 from astrbot.api.message_components import Node, Plain, Nodes
 import astrbot.api.message_components as Comp
@@ -25,56 +23,50 @@ from .strategies.share_page import SharePageStrategy
 from .strategies.third_party import ThirdPartyStrategy
 from .strategies.mobile_api import MobileApiStrategy, set_device_cache_dir
 from .utils.cookie import extract_and_format_cookies
+from ..faststart import ensure_faststart
+from ..cookie_provider import (
+    CookieProvider,
+    CookieSnapshot,
+    EMPTY_COOKIE,
+    format_cookie_header,
+)
+
+
+_COOKIE_PROVIDER: CookieProvider | None = None
 
 
-_COOKIE_FILE_PATH: str | None = None
+def _format_file_cookies(cookies: dict) -> str:
+    cookie_str = format_cookie_header(cookies)
+    return extract_and_format_cookies(cookie_str) if cookie_str else ""
 
 
-def init_douyin_login(data_dir: str) -> None:
-    global _COOKIE_FILE_PATH
-    _COOKIE_FILE_PATH = os.path.join(data_dir, "douyin_cookies.json")
+def init_douyin_login(data_dir: str, cookie_from_config: str = "") -> None:
+    global _COOKIE_PROVIDER
+    _COOKIE_PROVIDER = CookieProvider(
+        os.path.join(data_dir, "douyin_cookies.json"),
+        override=cookie_from_config,
+        formatter=_format_file_cookies,
+        name="抖音 Cookie",
+    )
     set_device_cache_dir(data_dir)
 
 
-async def _load_douyin_cookies_from_file() -> str | None:
-    if not _COOKIE_FILE_PATH or not os.path.exists(_COOKIE_FILE_PATH):
-        return None
-    try:
-        async with aiofiles.open(_COOKIE_FILE_PATH, "r", encoding="utf-8") as f:
-            content = await f.read()
-        if not content.strip():
-            return None
-        cookies = json.loads(content)
-        if not isinstance(cookies, dict) or not cookies:
-            return None
-        cookie_str = "; ".join(f"{k}={v}" for k, v in cookies.items() if k and v)
-        if not cookie_str:
-            return None
-        return extract_and_format_cookies(cookie_str)
-    except Exception as e:
-        logger.error(f"加载抖音 Cookie 文件失败: {e}")
-        return None
-
-
-async def get_effective_douyin_cookie(
-    *,
-    cookie_loaded: bool,
-    cookie_from_config: str,
-    cookie_from_file: str,
-) -> tuple[str, bool, str]:
-    resolved_file_cookie = cookie_from_file
-    resolved_loaded = cookie_loaded
-
-    if not resolved_loaded:
-        resolved_file_cookie = (await _load_douyin_cookies_from_file()) or ""
-        resolved_loaded = True
-
-    effective_cookie = cookie_from_config or resolved_file_cookie or ""
-    return effective_cookie, resolved_loaded, resolved_file_cookie
+async def get_effective_douyin_cookie() -> CookieSnapshot:
+    """配置中的 Cookie 优先，否则使用 douyin_cookies.json（文件变更后自动重新加载）。"""
+    if _COOKIE_PROVIDER is None:
+        return EMPTY_COOKIE
+    return await _COOKIE_PROVIDER.get()
 
 
 class DouyinParser:
-    def __init__(self, cookie: str = "", api_url: str = "", data_dir: str = ""):
+    def __init__(
+        self,
+        cookie: str | CookieSnapshot = "",
+        api_url: str = "",
+        data_dir: str = "",
+    ):
+        if not isinstance(cookie, CookieSnapshot):
+            cookie = CookieSnapshot.from_header(cookie or "")
         self._cookie = cookie
         self._api_url = api_url
 
@@ -89,12 +81,20 @@ class DouyinParser:
 
     @classmethod
     def from_config(
-        cls, cookie: str = "", api_url: str = "", data_dir: str = ""
+        cls,
+        cookie: str | CookieSnapshot = "",
+        api_url: str = "",
+        data_dir: str = "",
     ) -> "DouyinParser":
         return cls(cookie=cookie, api_url=api_url, data_dir=data_dir)
 
     async def parse(self, url: str) -> DouyinParseResult:
-        params = StrategyParams(url=url, cookie=self._cookie, api_url=self._api_url)
+        params = StrategyParams(
+            url=url,
+            cookie=self._cookie.header,
+            api_url=self._api_url,
+            cookie_dict=self._cookie.cookies,
+        )
 
         for strategy in self._strategies:
             try:
@@ -182,7 +182,9 @@ async def send_douyin_with_title_forward(
             if media_type == "image":
                 component = Comp.Image.fromFileSystem(path=media_path)
             else:
-                component = Comp.Video.fromFileSystem(path=media_path)
+                component = Comp.Video.fromFileSystem(
+                    path=await ensure_faststart(media_path)
+                )
             media_nodes.append(
                 Node(uin=sender_id, name=media_sender_name, content=[component])
             )
@@ -4,10 +4,18 @@ from ..model import DouyinParseResult
 
 
 class StrategyParams:
-    def __init__(self, url: str, cookie: str = "", api_url: str = ""):
+    def __init__(
+        self,
+        url: str,
+        cookie: str = "",
+        api_url: str = "",
+        cookie_dict: dict[str, str] | None = None,
+    ):
         self.url = url
         self.cookie = cookie
         self.api_url = api_url
+        # 预解析的 Cookie dict，避免每个策略重复解析字符串
+        self.cookie_dict = cookie_dict if cookie_dict is not None else {}
 
 
 class BaseStrategy(ABC):
@@ -1,5 +1,6 @@
 import json
 import re
+from collections import Counter
 
 import httpx
 
@@ -8,6 +9,7 @@ from astrbot.api import logger
 from .base import BaseStrategy, StrategyParams
 from ..model import DouyinParseResult, parse_aweme_detail
 from ..utils.url import AwemeIdFetcher
+from ..utils.slides import SlidesInfoBatcher
 
 MOBILE_USER_AGENT = (
     "Mozilla/5.0 (Linux; Android 14; Pixel 8 Pro Build/UQBC) "
@@ -21,6 +23,65 @@ PC_USER_AGENT = (
     "Chrome/120.0.6099.43 Safari/537.36"
 )
 
+_SLIDES_BATCHER = SlidesInfoBatcher(
+    headers={
+        "User-Agent": MOBILE_USER_AGENT,
+        "Referer": "https://www.iesdouyin.com/",
+        "Accept": "application/json, text/plain, */*",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    }
+)
+
+
+def configure_slides_batch(window: float, max_batch: int) -> None:
+    """按插件配置设置图集接口的合并窗口与批大小。"""
+    _SLIDES_BATCHER.configure(window, max_batch)
+
+
+# _ROUTER_DATA.loaderData 中已知的作品数据位置：(页面 key, 页面内路径)
+_KNOWN_DETAIL_PATHS: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("video_(id)/page", ("videoInfoRes", "item_list")),
+    ("note_(id)/page", ("videoInfoRes", "item_list")),
+    ("slides_(id)/page", ("videoInfoRes", "item_list")),
+    ("video_(id)/page", ("aweme_detail",)),
+    ("note_(id)/page", ("aweme_detail",)),
+    ("slides_(id)/page", ("aweme_detail",)),
+)
+
+# 各路径命中次数，用于根据线上数据调整 _KNOWN_DETAIL_PATHS
+ROUTER_PATH_HITS: Counter[str] = Counter()
+
+
+def _record_path_hit(path: str) -> None:
+    ROUTER_PATH_HITS[path] += 1
+    logger.debug(
+        f"SharePage aweme_detail 路径: {path} (累计 {ROUTER_PATH_HITS[path]} 次)"
+    )
+
+
+def _get_path(obj, path: tuple[str, ...]):
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _pick_detail(node, aweme_id: str) -> dict | None:
+    """从 aweme_detail 字典或 item_list 列表中取作品数据，优先匹配 aweme_id。"""
+    if isinstance(node, dict):
+        return node or None
+    if not isinstance(node, list):
+        return None
+    items = [item for item in node if isinstance(item, dict) and item]
+    if not items:
+        return None
+    if aweme_id:
+        for item in items:
+            if str(item.get("aweme_id", "")) == aweme_id:
+                return item
+    return items[0]
+
 
 class SharePageStrategy(BaseStrategy):
     @property
@@ -76,37 +137,14 @@ class SharePageStrategy(BaseStrategy):
         )
 
     async def _try_slides_api(self, aweme_id: str) -> DouyinParseResult:
-        """通过 iesdouyin.com 的 slidesinfo 结构化接口获取作品数据。"""
-        headers = {
-            "User-Agent": MOBILE_USER_AGENT,
-            "Referer": "https://www.iesdouyin.com/",
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        }
+        """通过 iesdouyin.com 的 slidesinfo 结构化接口获取作品数据（与并发请求合批）。"""
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
-                response = await client.get(
-                    "https://www.iesdouyin.com/web/api/v2/aweme/slidesinfo/",
-                    params={
-                        "aweme_ids": f"[{aweme_id}]",
-                        "request_source": "200",
-                    },
-                    headers=headers,
-                )
-                if response.status_code >= 400:
-                    return DouyinParseResult(
-                        success=False,
-                        error=f"slides API HTTP {response.status_code}",
-                        source=self.name,
-                    )
-
-                data = response.json()
+            item = await _SLIDES_BATCHER.fetch(aweme_id)
         except Exception as e:
             return DouyinParseResult(
                 success=False, error=f"slides API 请求失败: {e}", source=self.name
             )
 
-        item = self._extract_first_item(data)
         if not item:
             return DouyinParseResult(
                 success=False, error="slides API 响应中无有效条目", source=self.name
@@ -114,20 +152,6 @@ class SharePageStrategy(BaseStrategy):
 
         return parse_aweme_detail(item, aweme_id, self.name)
 
-    @staticmethod
-    def _extract_first_item(data: dict) -> dict | None:
-        """从 API 响应中提取第一条有效作品数据。"""
-        for key in ("item_list", "aweme_details", "aweme_list"):
-            items = data.get(key)
-            if isinstance(items, list) and items:
-                for item in items:
-                    if isinstance(item, dict) and item:
-                        return item
-        item = data.get("aweme_detail")
-        if isinstance(item, dict) and item:
-            return item
-        return None
-
     async def _try_share_page(self, share_url: str, aweme_id: str) -> DouyinParseResult:
         is_pc = "douyin.com/video" in share_url or "douyin.com/note" in share_url
         ua = PC_USER_AGENT if is_pc else MOBILE_USER_AGENT
@@ -165,7 +189,7 @@ class SharePageStrategy(BaseStrategy):
                 source=self.name,
             )
 
-        aweme_detail = self._find_aweme_detail(data)
+        aweme_detail = self._find_aweme_detail(data, aweme_id)
         if not aweme_detail:
             return DouyinParseResult(
                 success=False,
@@ -207,35 +231,43 @@ class SharePageStrategy(BaseStrategy):
                         return html[brace_start : i + 1]
         return None
 
-    def _find_aweme_detail(self, data: dict) -> dict | None:
+    def _find_aweme_detail(self, data: dict, aweme_id: str = "") -> dict | None:
         loader = data.get("loaderData")
-        if not loader:
+        if not isinstance(loader, dict) or not loader:
             return None
 
-        def _search_dict(d: dict, _path: str = "") -> dict | None:
-            if not isinstance(d, dict):
-                return None
-            if "aweme_detail" in d and isinstance(d["aweme_detail"], dict):
-                logger.debug(f"SharePage aweme_detail 在 {_path}")
-                return d["aweme_detail"]
-            item_list = d.get("item_list")
-            if isinstance(item_list, list) and item_list:
-                first = item_list[0]
-                if isinstance(first, dict):
-                    logger.debug(f"SharePage item_list 在 {_path}")
-                    return first
+        # 热路径：按已知布局直接定位
+        for page_key, path in _KNOWN_DETAIL_PATHS:
+            entry = loader.get(page_key)
+            if not isinstance(entry, dict):
+                continue
+            found = _pick_detail(_get_path(entry, path), aweme_id)
+            if found:
+                _record_path_hit(f"{page_key}.{'.'.join(path)}")
+                return found
+
+        # 冷路径：未知布局时递归遍历
+        def _search_dict(d: dict, _path: str) -> tuple[dict, str] | None:
+            detail = d.get("aweme_detail")
+            if isinstance(detail, dict) and detail:
+                return detail, f"{_path}.aweme_detail"
+            found = _pick_detail(d.get("item_list"), aweme_id)
+            if found:
+                return found, f"{_path}.item_list"
             for k, v in d.items():
                 if isinstance(v, dict):
-                    found = _search_dict(v, f"{_path}.{k}")
-                    if found:
-                        return found
+                    hit = _search_dict(v, f"{_path}.{k}")
+                    if hit:
+                        return hit
             return None
 
         for entry_key, entry in loader.items():
             if not isinstance(entry, dict):
                 continue
-            found = _search_dict(entry, f"loaderData.{entry_key}")
-            if found:
+            hit = _search_dict(entry, entry_key)
+            if hit:
+                found, path = hit
+                _record_path_hit(f"fallback:{path}")
                 return found
 
         return None
@@ -13,6 +13,7 @@ from .base import BaseStrategy, StrategyParams
 from ..model import DouyinParseResult, parse_aweme_detail
 from ..utils.url import AwemeIdFetcher
 from ..sign import ABogus
+from ...cookie_provider import parse_cookie_header
 
 
 POST_DETAIL = "https://www.douyin.com/aweme/v1/web/aweme/detail/"
@@ -35,19 +36,6 @@ def _gen_webid() -> str:
     return ts_part + rand_part
 
 
-def _parse_cookie_to_dict(cookie_str: str) -> dict[str, str]:
-    """将 cookie 字符串转为 dict。"""
-    if not cookie_str:
-        return {}
-    result = {}
-    for part in cookie_str.split(";"):
-        part = part.strip()
-        if "=" in part:
-            key, value = part.split("=", 1)
-            result[key.strip()] = value.strip()
-    return result
-
-
 class WebApiStrategy(BaseStrategy):
     @property
     def name(self) -> str:
@@ -57,8 +45,8 @@ class WebApiStrategy(BaseStrategy):
         if not params.cookie:
             return DouyinParseResult(success=False, error="Web API 策略需要 Cookie")
 
-        # 将 cookie 字符串转为 dict，如 httpx.AsyncClient(cookies=dict) 方式传递
-        cookie_dict = _parse_cookie_to_dict(params.cookie)
+        # 以 httpx.AsyncClient(cookies=dict) 方式传递
+        cookie_dict = params.cookie_dict or parse_cookie_header(params.cookie)
 
         user_agent = (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -0,0 +1,118 @@
+"""
+slidesinfo 接口微批处理
+
+短时间内多个图集链接会被合并为一次 aweme_ids=[id1,id2,...] 请求，
+再按 aweme_id 将结果分发给各个等待者。
+"""
+
+import asyncio
+
+import httpx
+
+from astrbot.api import logger
+
+from ..constants import SLIDES_BATCH_SIZE, SLIDES_BATCH_WINDOW, SLIDES_INFO
+
+
+class SlidesInfoError(Exception):
+    pass
+
+
+class SlidesInfoBatcher:
+    def __init__(
+        self,
+        headers: dict | None = None,
+        window: float = SLIDES_BATCH_WINDOW,
+        max_batch: int = SLIDES_BATCH_SIZE,
+        endpoint: str = SLIDES_INFO,
+        timeout: float = 15,
+    ):
+        self.headers = headers or {}
+        self.configure(window, max_batch)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def configure(self, window: float, max_batch: int) -> None:
+        """设置合并窗口（秒）与单批最多作品数，对之后发起的批次生效。"""
+        self.window = max(0.0, float(window))
+        self.max_batch = max(1, int(max_batch))
+
+    async def fetch(self, aweme_id: str) -> dict | None:
+        """获取单个作品数据；返回 None 表示接口响应中没有该作品。"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(aweme_id, []).append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        task = asyncio.create_task(self._dispatch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: dict[str, list[asyncio.Future]]) -> None:
+        aweme_ids = list(batch)
+        try:
+            items = await self._request(aweme_ids)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(SlidesInfoError(str(e)))
+            return
+
+        if len(aweme_ids) > 1:
+            logger.debug(
+                f"slidesinfo 批量请求: {len(aweme_ids)} 个作品，命中 {sum(1 for a in aweme_ids if a in items)} 个"
+            )
+        for aweme_id, futures in batch.items():
+            item = items.get(aweme_id)
+            for future in futures:
+                if not future.done():
+                    future.set_result(item)
+
+    async def _request(self, aweme_ids: list[str]) -> dict[str, dict]:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(
+                self.endpoint,
+                params={
+                    "aweme_ids": f"[{','.join(aweme_ids)}]",
+                    "request_source": "200",
+                },
+                headers=self.headers,
+            )
+        if response.status_code >= 400:
+            raise SlidesInfoError(f"slides API HTTP {response.status_code}")
+        data = response.json()
+
+        items: list[dict] = []
+        for key in ("item_list", "aweme_details", "aweme_list"):
+            raw = data.get(key)
+            if isinstance(raw, list):
+                items.extend(i for i in raw if isinstance(i, dict) and i)
+        detail = data.get("aweme_detail")
+        if isinstance(detail, dict) and detail:
+            items.append(detail)
+
+        result: dict[str, dict] = {}
+        for item in items:
+            item_id = str(item.get("aweme_id") or "")
+            if item_id and item_id not in result:
+                result[item_id] = item
+        # 单个请求时接口可能不回传 aweme_id，沿用首条结果
+        if len(aweme_ids) == 1 and aweme_ids[0] not in result and items:
+            result[aweme_ids[0]] = items[0]
+        return result
@@ -2,6 +2,8 @@ import re
 
 import httpx
 
+from ...short_link import SHORT_LINKS, is_short_link
+
 
 class AwemeIdFetcher:
     _DOUYIN_VIDEO_URL_PATTERN = re.compile(r"video/([^/?]*)")
@@ -14,20 +16,26 @@ class AwemeIdFetcher:
         if not isinstance(url, str):
             raise TypeError("参数必须是字符串类型")
 
-        transport = httpx.AsyncHTTPTransport(retries=3)
-        async with httpx.AsyncClient(transport=transport, timeout=10) as client:
-            response = await client.get(url, follow_redirects=True)
-            response.raise_for_status()
-            response_url = str(response.url)
-
-            for pattern in [
-                cls._DOUYIN_VIDEO_URL_PATTERN,
-                cls._DOUYIN_VIDEO_URL_PATTERN_NEW,
-                cls._DOUYIN_NOTE_URL_PATTERN,
-                cls._DOUYIN_DISCOVER_URL_PATTERN,
-            ]:
-                match = pattern.search(response_url)
-                if match:
-                    return match.group(1)
-
-            raise ValueError(f"未在响应地址中找到 aweme_id: {response_url}")
+        if is_short_link(url):
+            # v.douyin.com 短链只读取跳转地址，结果由解析服务缓存
+            response_url = await SHORT_LINKS.resolve(url)
+            if not response_url:
+                raise ValueError(f"短链解析失败: {url}")
+        else:
+            transport = httpx.AsyncHTTPTransport(retries=3)
+            async with httpx.AsyncClient(transport=transport, timeout=10) as client:
+                response = await client.get(url, follow_redirects=True)
+                response.raise_for_status()
+                response_url = str(response.url)
+
+        for pattern in [
+            cls._DOUYIN_VIDEO_URL_PATTERN,
+            cls._DOUYIN_VIDEO_URL_PATTERN_NEW,
+            cls._DOUYIN_NOTE_URL_PATTERN,
+            cls._DOUYIN_DISCOVER_URL_PATTERN,
+        ]:
+            match = pattern.search(response_url)
+            if match:
+                return match.group(1)
+
+        raise ValueError(f"未在响应地址中找到 aweme_id: {response_url}")
@@ -0,0 +1,187 @@
+"""
+发送前的 MP4 faststart 处理
+
+moov 位于文件末尾的 MP4，或直接拼接的 MPEG-TS 文件，需要客户端下载完整个文件才能播放。
+这里检查顶层 box 顺序，必要时用 ffmpeg 无损重封装（-c copy -movflags +faststart），
+结果以 {原文件名}.fs.mp4 保存在原目录中复用，并在 {原文件名}.fs.mp4.src 中记录
+源文件的大小、修改时间与 inode，三者一致才复用。其他缓存刷新源文件修改时间时
+应调用 touch_source，以便同步更新记录。
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import struct
+
+from astrbot.api import logger
+
+VIDEO_EXTENSIONS = (".mp4", ".m4v", ".mov", ".ts")
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+FASTSTART_STATS = {
+    "checked": 0,
+    "remuxed": 0,
+    "cache_hits": 0,
+    "failed": 0,
+    "remux_seconds": 0.0,
+}
+
+
+def detect_layout(path: str) -> str:
+    """
+    返回文件布局：
+    - "faststart"：moov 在 mdat 之前（无需处理）
+    - "moov_at_end"：mdat 在 moov 之前
+    - "ts"：MPEG-TS
+    - "unknown"：无法识别
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(TS_PACKET_SIZE + 1)
+            if (
+                len(head) > TS_PACKET_SIZE
+                and head[0] == TS_SYNC_BYTE
+                and head[TS_PACKET_SIZE] == TS_SYNC_BYTE
+            ):
+                return "ts"
+
+            file_size = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset + 8 <= file_size:
+                f.seek(offset)
+                header = f.read(16)
+                size, box_type = struct.unpack(">I4s", header[:8])
+                if size == 1 and len(header) >= 16:
+                    size = struct.unpack(">Q", header[8:16])[0]
+                elif size == 0:
+                    size = file_size - offset
+                if size < 8:
+                    return "unknown"
+                if box_type == b"moov":
+                    return "faststart"
+                if box_type == b"mdat":
+                    return "moov_at_end"
+                offset += size
+    except OSError as e:
+        logger.debug(f"读取视频文件失败 {path}: {e}")
+    return "unknown"
+
+
+def _source_marker(dest: str) -> str:
+    return f"{dest}.src"
+
+
+def _source_signature(src: str) -> dict:
+    st = os.stat(src)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+
+
+def _is_fresh(src: str, dest: str) -> bool:
+    """dest 是否由当前的 src 生成（比较记录的源文件大小、修改时间与 inode）。"""
+    try:
+        with open(_source_marker(dest), "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+        return os.path.exists(dest) and recorded == _source_signature(src)
+    except (OSError, ValueError):
+        return False
+
+
+def _mark_source(src: str, dest: str) -> None:
+    try:
+        with open(_source_marker(dest), "w", encoding="utf-8") as f:
+            json.dump(_source_signature(src), f)
+    except OSError as e:
+        logger.debug(f"记录 faststart 源文件信息失败 {dest}: {e}")
+
+
+def touch_source(path: str) -> None:
+    """
+    刷新 path 的修改时间（延后自动清理）；已有对应的 faststart 结果时一并刷新，
+    并更新记录，避免仅因时间变化而重新封装。
+    """
+    dest = f"{os.path.splitext(path)[0]}.fs.mp4"
+    fresh = _is_fresh(path, dest)
+    os.utime(path, None)
+    if fresh:
+        try:
+            os.utime(dest, None)
+        except OSError:
+            return
+        _mark_source(path, dest)
+
+
+def faststart_summary() -> str:
+    s = FASTSTART_STATS
+    if not s["checked"]:
+        return "暂无 faststart 处理记录"
+    avg = s["remux_seconds"] / s["remuxed"] if s["remuxed"] else 0
+    return (
+        f"🎞️ faststart 检查 {s['checked']} 次 | 复用 {s['cache_hits']} 次 | "
+        f"重封装 {s['remuxed']} 次（共 {s['remux_seconds']:.1f}s，平均 {avg:.2f}s）"
+        f" | 失败 {s['failed']} 次"
+    )
+
+
+async def _remux(src: str, dest: str, layout: str) -> bool:
+    part = f"{dest}.part"
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", src, "-c", "copy"]
+    if layout == "ts":
+        cmd += ["-bsf:a", "aac_adtstoasc"]
+    cmd += ["-movflags", "+faststart", "-f", "mp4", part]
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr_data = await process.communicate()
+    if process.returncode != 0:
+        logger.warning(
+            f"faststart 重封装失败: {stderr_data.decode(errors='ignore').strip()[:300]}"
+        )
+        if os.path.exists(part):
+            os.remove(part)
+        return False
+    os.replace(part, dest)
+    return True
+
+
+async def ensure_faststart(path: str) -> str:
+    """返回适合边下边播的视频路径；无需处理或处理失败时返回原路径。"""
+    if (
+        not path
+        or not path.lower().endswith(VIDEO_EXTENSIONS)
+        or path.endswith(".fs.mp4")
+        or not os.path.exists(path)
+    ):
+        return path
+
+    FASTSTART_STATS["checked"] += 1
+    dest = f"{os.path.splitext(path)[0]}.fs.mp4"
+    if _is_fresh(path, dest):
+        FASTSTART_STATS["cache_hits"] += 1
+        return dest
+
+    layout = await asyncio.to_thread(detect_layout, path)
+    if layout not in ("moov_at_end", "ts"):
+        return path
+    if not shutil.which("ffmpeg"):
+        logger.debug(f"视频需要 faststart 处理（{layout}），但未找到 ffmpeg")
+        return path
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    if not await _remux(path, dest, layout):
+        FASTSTART_STATS["failed"] += 1
+        return path
+    _mark_source(path, dest)
+
+    elapsed = loop.time() - started
+    FASTSTART_STATS["remuxed"] += 1
+    FASTSTART_STATS["remux_seconds"] += elapsed
+    logger.debug(
+        f"faststart 重封装完成（{layout}）: {os.path.basename(path)}，用时 {elapsed:.2f}s，"
+        f"累计 {FASTSTART_STATS['remuxed']} 次 / {FASTSTART_STATS['remux_seconds']:.1f}s"
+    )
+    return dest
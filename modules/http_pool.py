@@ -0,0 +1,26 @@
+import httpx
+
+# 插件内共享的 HTTP 连接池：下载类请求复用连接，避免每次新建 AsyncClient
+_CLIENT: httpx.AsyncClient | None = None
+
+POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=16)
+POOL_TIMEOUT = httpx.Timeout(30, connect=10)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享 AsyncClient（惰性创建，关闭后自动重建）。"""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            limits=POOL_LIMITS,
+            timeout=POOL_TIMEOUT,
+            follow_redirects=True,
+        )
+    return _CLIENT
+
+
+async def close_http_client() -> None:
+    global _CLIENT
+    if _CLIENT is not None and not _CLIENT.is_closed:
+        await _CLIENT.aclose()
+    _CLIENT = None
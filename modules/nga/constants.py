@@ -18,3 +18,6 @@ DOWNLOAD_HEADERS = {
 TIMEOUT = 30
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+
+# 第 1 页 HTML 仅用于补全用户名，超过该时间（秒）未返回则放弃
+HTML_ENRICH_TIMEOUT = 5
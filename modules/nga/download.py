@@ -4,6 +4,7 @@ import os
 
 import httpx
 
+from ..stream_download import IMAGE_MAX_BYTES, download_in_waves, stream_to_file
 from .constants import DOWNLOAD_HEADERS, IMAGE_EXTS, TIMEOUT
 
 logger = logging.getLogger(__name__)
@@ -30,10 +31,9 @@ class NgaDownloader:
             async with httpx.AsyncClient(
                 proxy=self._proxy, timeout=TIMEOUT, follow_redirects=True
             ) as cli:
-                resp = await cli.get(url, headers=DOWNLOAD_HEADERS)
-                resp.raise_for_status()
-                with open(path, "wb") as f:
-                    f.write(resp.content)
+                await stream_to_file(
+                    cli, url, path, headers=DOWNLOAD_HEADERS, max_bytes=IMAGE_MAX_BYTES
+                )
             return path
         except Exception as e:
             logger.debug(f"NGA 下载失败 {url}: {e}")
@@ -48,19 +48,26 @@ class NgaDownloader:
             "op_post_id": getattr(parse_result, "op_post_id", ""),
             "op_score": getattr(parse_result, "op_score", 0),
         }
-        downloaded = 0
 
-        for item in parse_result.media_items:
-            if downloaded >= self.max_images:
-                break
-            path = await self._download_file(item.url)
-            if path:
-                result.setdefault("ordered_media", []).append(
-                    {"path": path, "type": "image"}
-                )
-                downloaded += 1
+        # 先按楼层顺序列出全部媒体，并发下载后再放回对应位置
+        floors = [parse_result.media_items] + [
+            reply.media_items for reply in parse_result.replies
+        ]
+        candidates = [[item.url] for items in floors for item in items]
+        paths = iter(
+            await download_in_waves(candidates, self._download_file, self.max_images)
+        )
+        floor_media = []
+        for items in floors:
+            media = []
+            for _ in items:
+                path = next(paths)
+                if path:
+                    media.append({"path": path, "type": "image"})
+            floor_media.append(media)
 
-        for reply in parse_result.replies:
+        result["ordered_media"] = floor_media[0]
+        for reply, media in zip(parse_result.replies, floor_media[1:]):
             reply_dict = {
                 "floor": reply.floor,
                 "author": reply.author,
@@ -70,15 +77,8 @@ class NgaDownloader:
                 "reply_to_pids": reply.reply_to_pids,
                 "post_date": reply.post_date,
                 "raw_bbcode": reply.raw_bbcode,
-                "media": [],
+                "media": media,
             }
-            for item in reply.media_items:
-                if downloaded >= self.max_images:
-                    break
-                path = await self._download_file(item.url)
-                if path:
-                    reply_dict["media"].append({"path": path, "type": "image"})
-                    downloaded += 1
             result["replies"].append(reply_dict)
 
         if not result["ordered_media"] and not result["replies"]:
@@ -1,3 +1,4 @@
+import asyncio
 import re
 from xml.etree import ElementTree as ET
 
@@ -5,10 +6,12 @@ import httpx
 
 from astrbot.api import logger
 
+from ..async_tasks import discard_task
 from .constants import (
     API_READ,
     NGA_UA,
     BROWSER_UA,
+    HTML_ENRICH_TIMEOUT,
     REG_NGA,
     TIMEOUT,
 )
@@ -73,16 +76,12 @@ class NgaParser:
             error_code = self._check_error(raw)
             if error_code:
                 if attempt < retries:
-                    import asyncio
-
                     await asyncio.sleep(1 + attempt)
                     continue
                 raise NgaError(f"NGA 返回错误 (code={error_code})")
             if raw.strip().endswith("</root>"):
                 return raw
             if attempt < retries:
-                import asyncio
-
                 await asyncio.sleep(1 + attempt)
         raise NgaError("NGA 返回的 XML 不完整，请稍后重试")
 
@@ -606,16 +605,48 @@ class NgaParser:
                 user_map[uid] = nickname or username
         return user_map
 
+    @staticmethod
+    def _has_real_names(user_map: dict[str, str], author_ids: list[str]) -> bool:
+        return all(
+            user_map.get(uid) and not user_map[uid].startswith("UID")
+            for uid in author_ids
+            if uid
+        )
+
+    async def _enrich_user_map(
+        self, user_map: dict[str, str], html_task: asyncio.Task
+    ) -> None:
+        """用第 1 页 HTML 补全用户名，超过 HTML_ENRICH_TIMEOUT 未返回则放弃。"""
+        try:
+            html_p1 = await asyncio.wait_for(html_task, HTML_ENRICH_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.debug(f"NGA HTML {HTML_ENRICH_TIMEOUT}s 内未返回，跳过用户名补全")
+            return
+        except Exception:
+            return
+        for uid, name in self._extract_user_map_from_html(html_p1).items():
+            if uid not in user_map or user_map[uid].startswith("UID"):
+                user_map[uid] = name
+
     async def parse(self, url: str) -> NgaParseResult:
         tid = self.get_tid(url)
+        # HTML 只用于补全用户名（或作为 XML 失败时的回退），与 XML 同时请求
+        html_task = asyncio.ensure_future(self._fetch_html(tid, 1))
+        try:
+            return await self._parse_xml_thread(tid, html_task)
+        finally:
+            discard_task(html_task)
 
+    async def _parse_xml_thread(
+        self, tid: str, html_task: asyncio.Task
+    ) -> NgaParseResult:
         try:
             raw_xml = await self._fetch_xml(tid, 1)
         except NgaError as e:
             if "XML" in str(e):
                 logger.debug(f"NGA XML 接口返回异常，尝试 HTML 回退 ({tid})")
                 try:
-                    return await self._parse_html_fallback(tid)
+                    return await self._parse_html_fallback(tid, html_task)
                 except Exception:
                     pass
             return NgaParseResult(success=False, error=e.msg)
@@ -631,15 +662,6 @@ class NgaParser:
         try:
             user_map = self._build_user_map(root)
 
-            try:
-                html_p1 = await self._fetch_html(tid, 1)
-                html_user_map = self._extract_user_map_from_html(html_p1)
-                for uid, name in html_user_map.items():
-                    if uid not in user_map or user_map[uid].startswith("UID"):
-                        user_map[uid] = name
-            except Exception:
-                pass
-
             thread_elem = root.find("__T")
             if thread_elem is None:
                 return NgaParseResult(success=False, error="未找到帖子信息")
@@ -647,9 +669,6 @@ class NgaParser:
 
             title = self._find_item_text(thread_elem, "subject")
             author_id = self._find_item_text(thread_elem, "authorid")
-            author = user_map.get(
-                author_id, self._find_item_text(thread_elem, "author")
-            )
             forum_name = (
                 self._find_item_text(forum_elem, "name")
                 if forum_elem is not None
@@ -689,6 +708,18 @@ class NgaParser:
                         if display_name and not display_name.startswith("UID"):
                             user_map[uid_scanned] = display_name
 
+            # XML 已有全部作者的真实用户名时不再等待 HTML
+            author_ids = [author_id] + [
+                self._find_item_text(p, "authorid") for p in posts
+            ]
+            if self._has_real_names(user_map, author_ids):
+                discard_task(html_task)
+            else:
+                await self._enrich_user_map(user_map, html_task)
+            author = user_map.get(
+                author_id, self._find_item_text(thread_elem, "author")
+            )
+
             op_content = ""
             op_media: list[NgaMedia] = []
             all_replies: list[NgaReply] = []
@@ -855,8 +886,10 @@ class NgaParser:
         except Exception as e:
             return NgaParseResult(success=False, error=f"NGA 解析异常: {e}")
 
-    async def _parse_html_fallback(self, tid: str) -> NgaParseResult:
-        html_p1 = await self._fetch_html(tid, 1)
+    async def _parse_html_fallback(
+        self, tid: str, html_task: asyncio.Task | None = None
+    ) -> NgaParseResult:
+        html_p1 = await (html_task or self._fetch_html(tid, 1))
         title_m = re.search(r"<h1\s+id='currentTopicName'[^>]*>(.*?)</h1>", html_p1)
         if not title_m:
             raise NgaError("HTML 解析失败：未找到标题")
@@ -0,0 +1,216 @@
+"""
+短链接解析
+
+b23.tv / bili2233.cn / xhslink.com / v.douyin.com / m.q.qq.com 统一在这里解析：
+- 复用共享连接池，只读取重定向响应头中的 Location，不下载落地页
+- 落地仍是短链域名时继续跟随（最多 SHORT_LINK_MAX_HOPS 跳）
+- 每个域名单独限制并发请求数
+- 短链 → 真实地址的映射持久化到 JSON，同一短链并发解析只请求一次
+"""
+
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urljoin, urlparse
+
+import aiofiles
+
+from astrbot.api import logger
+
+from .http_pool import get_http_client
+
+# 域名 -> 最大并发解析数
+SHORT_LINK_HOSTS = {
+    "b23.tv": 4,
+    "bili2233.cn": 4,
+    "xhslink.com": 2,
+    "v.douyin.com": 4,
+    "m.q.qq.com": 2,
+}
+# 落地地址带有时效性参数的域名单独设置缓存有效期（秒），其余永久有效
+SHORT_LINK_TTL = {
+    # 小红书落地地址中的 xsec_token 会过期
+    "xhslink.com": 6 * 3600,
+}
+# 短链标识在查询参数中的域名，缓存键需保留查询串
+SHORT_LINK_QUERY_HOSTS = {"m.q.qq.com"}
+SHORT_LINK_CACHE_SIZE = 5000
+SHORT_LINK_MAX_HOPS = 5
+SHORT_LINK_TIMEOUT = 10
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+def _host(url: str) -> str:
+    if "://" not in url:
+        url = f"https://{url}"
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def is_short_link(url: str) -> bool:
+    return _host(url) in SHORT_LINK_HOSTS
+
+
+class ShortLinkResolver:
+    def __init__(self, max_entries: int = SHORT_LINK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.file_path: str | None = None
+        # key -> (真实地址, 写入时间)
+        self._cache: dict[str, tuple[str, float]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self.stats: dict[str, dict[str, int]] = {}
+
+    def load(self, file_path: str) -> None:
+        self.file_path = file_path
+        if not os.path.exists(file_path):
+            return
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._cache = {
+                k: (v[0], float(v[1]))
+                for k, v in data.items()
+                if isinstance(v, list) and len(v) == 2
+            }
+            logger.debug(f"短链缓存已加载 {len(self._cache)} 条: {file_path}")
+        except Exception as e:
+            logger.warning(f"读取短链缓存失败，将重新记录: {e}")
+            self._cache = {}
+
+    async def _save(self) -> None:
+        if not self.file_path:
+            return
+        tmp_path = f"{self.file_path}.tmp"
+        data = {k: [url, ts] for k, (url, ts) in self._cache.items()}
+        try:
+            async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+                await f.write(json.dumps(data, ensure_ascii=False))
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            logger.warning(f"保存短链缓存失败: {e}")
+
+    @staticmethod
+    def _key(url: str) -> str:
+        if "://" not in url:
+            url = f"https://{url}"
+        parsed = urlparse(url)
+        host = _host(url)
+        key = f"{host}{parsed.path.rstrip('/')}"
+        if host in SHORT_LINK_QUERY_HOSTS and parsed.query:
+            key = f"{key}?{parsed.query}"
+        return key
+
+    def _stat(self, host: str, field: str) -> None:
+        counters = self.stats.setdefault(
+            host, {"hits": 0, "misses": 0, "joined": 0, "errors": 0}
+        )
+        counters[field] += 1
+
+    def _lookup(self, key: str, host: str) -> str | None:
+        entry = self._cache.get(key)
+        if not entry:
+            return None
+        url, stored_at = entry
+        ttl = SHORT_LINK_TTL.get(host)
+        if ttl and time.time() - stored_at > ttl:
+            self._cache.pop(key, None)
+            return None
+        return url
+
+    def _limit(self, host: str) -> asyncio.Semaphore:
+        if host not in self._limits:
+            self._limits[host] = asyncio.Semaphore(SHORT_LINK_HOSTS.get(host, 2))
+        return self._limits[host]
+
+    async def resolve(self, url: str, headers: dict | None = None) -> str | None:
+        """
+        返回短链指向的地址；非短链原样返回。
+        无重定向时返回最后请求的地址，请求失败返回 None。
+        """
+        if "://" not in url:
+            url = f"https://{url}"
+        host = _host(url)
+        if host not in SHORT_LINK_HOSTS:
+            return url
+
+        key = self._key(url)
+        cached = self._lookup(key, host)
+        if cached:
+            self._stat(host, "hits")
+            logger.debug(f"短链缓存命中: {url} -> {cached}")
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight:
+            # 合并到正在进行的请求，不算缓存命中
+            self._stat(host, "joined")
+            return await asyncio.shield(inflight)
+
+        self._stat(host, "misses")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            async with self._limit(host):
+                target = await self._follow(url, headers)
+            future.set_result(target)
+        except Exception as e:
+            self._stat(host, "errors")
+            logger.warning(f"短链解析失败: {url}, {e}")
+            future.set_result(None)
+            return None
+        finally:
+            # 被取消时也要让等待同一请求的调用方返回
+            if not future.done():
+                future.set_result(None)
+            self._inflight.pop(key, None)
+
+        if target and not is_short_link(target):
+            self._cache[key] = (target, time.time())
+            while len(self._cache) > self.max_entries:
+                self._cache.pop(next(iter(self._cache)))
+            await self._save()
+        return target
+
+    @staticmethod
+    async def _follow(url: str, headers: dict | None) -> str:
+        client = get_http_client()
+        current = url
+        for _ in range(SHORT_LINK_MAX_HOPS):
+            async with client.stream(
+                "GET",
+                current,
+                headers=headers,
+                follow_redirects=False,
+                timeout=SHORT_LINK_TIMEOUT,
+            ) as resp:
+                location = resp.headers.get("Location", "")
+                if resp.status_code not in _REDIRECT_CODES or not location:
+                    resp.raise_for_status()
+                    return current
+            current = urljoin(current, location)
+            if not is_short_link(current):
+                return current
+        return current
+
+    def summary(self) -> str:
+        if not self.stats:
+            return f"暂无短链解析记录（缓存 {len(self._cache)} 条）"
+        lines = [f"🔗 短链缓存 {len(self._cache)} 条"]
+        for host, c in sorted(self.stats.items()):
+            total = c["hits"] + c["misses"] + c["joined"]
+            rate = c["hits"] / total * 100 if total else 0
+            lines.append(
+                f"{host} | 命中 {c['hits']}/{total} ({rate:.0f}%) | "
+                f"合并 {c['joined']} | 失败 {c['errors']}"
+            )
+        return "\n".join(lines)
+
+
+SHORT_LINKS = ShortLinkResolver()
+
+
+def init_short_link_cache(data_dir: str) -> ShortLinkResolver:
+    SHORT_LINKS.load(os.path.join(data_dir, "short_links.json"))
+    return SHORT_LINKS
@@ -0,0 +1,120 @@
+"""
+流式文件下载
+
+按块读取响应并合并成较大的缓冲区后再写盘，写入通过 aiofiles 在线程中完成，
+不阻塞事件循环。先写入 {目标}.part，完成后原子重命名；
+超过单文件字节上限时立即中止并删除临时文件。
+
+download_in_waves 用于帖子类媒体：按楼层顺序分批并发下载，结果与逐个下载一致。
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable
+from urllib.parse import urlparse
+
+import aiofiles
+import httpx
+
+# 累积到该大小再写一次盘
+STREAM_FLUSH_SIZE = 1024 * 1024
+# 图片单文件上限
+IMAGE_MAX_BYTES = 30 * 1024 * 1024
+# 同一域名同时下载的文件数
+MEDIA_HOST_CONCURRENCY = 4
+
+_HOST_LIMITS: dict[str, asyncio.Semaphore] = {}
+
+
+class DownloadTooLarge(Exception):
+    def __init__(self, url: str, max_bytes: int):
+        super().__init__(f"文件超过 {max_bytes / 1024 / 1024:.0f}MB 上限: {url}")
+        self.url = url
+        self.max_bytes = max_bytes
+
+
+async def stream_to_file(
+    client: httpx.AsyncClient,
+    url: str,
+    dest: str,
+    headers: dict | None = None,
+    max_bytes: float | None = None,
+    flush_size: int = STREAM_FLUSH_SIZE,
+) -> int:
+    """下载 url 到 dest，返回写入字节数；失败时抛出异常且不留下半成品。"""
+    part_path = f"{dest}.part"
+    written = 0
+    try:
+        async with client.stream("GET", url, headers=headers) as resp:
+            resp.raise_for_status()
+            declared = int(resp.headers.get("Content-Length") or 0)
+            if max_bytes and declared > max_bytes:
+                raise DownloadTooLarge(url, int(max_bytes))
+            buffer = bytearray()
+            async with aiofiles.open(part_path, "wb") as f:
+                async for chunk in resp.aiter_bytes():
+                    written += len(chunk)
+                    if max_bytes and written > max_bytes:
+                        raise DownloadTooLarge(url, int(max_bytes))
+                    buffer += chunk
+                    if len(buffer) >= flush_size:
+                        await f.write(bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await f.write(bytes(buffer))
+        os.replace(part_path, dest)
+        return written
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlparse(url).hostname or ""
+    if host not in _HOST_LIMITS:
+        _HOST_LIMITS[host] = asyncio.Semaphore(MEDIA_HOST_CONCURRENCY)
+    return _HOST_LIMITS[host]
+
+
+async def download_in_waves(
+    candidates: list[list[str]],
+    fetch: Callable[[str], Awaitable[str | None]],
+    max_items: int,
+) -> list[str | None]:
+    """
+    candidates[i] 为第 i 个媒体的备选地址（依次尝试），返回与之对齐的本地路径，
+    未下载或全部失败的位置为 None。
+
+    结果等同于按顺序逐个下载、成功 max_items 个后停止：每一批只取补足名额所需的
+    下一段媒体并发下载，失败空出的名额由下一批按顺序补上。
+    """
+    results: list[str | None] = [None] * len(candidates)
+    # 同一帖子中重复出现的地址只下载一次，避免并发写同一个文件
+    inflight: dict[str, asyncio.Future] = {}
+
+    async def limited_fetch(url: str) -> str | None:
+        async with _host_limit(url):
+            return await fetch(url)
+
+    async def fetch_one(index: int) -> None:
+        for url in candidates[index]:
+            if not url:
+                continue
+            if url not in inflight:
+                inflight[url] = asyncio.ensure_future(limited_fetch(url))
+            path = await inflight[url]
+            if path:
+                results[index] = path
+                return
+
+    succeeded = 0
+    next_index = 0
+    while succeeded < max_items and next_index < len(candidates):
+        wave = range(
+            next_index, min(len(candidates), next_index + max_items - succeeded)
+        )
+        next_index = wave.stop
+        await asyncio.gather(*(fetch_one(i) for i in wave))
+        succeeded += sum(1 for i in wave if results[i])
+    return results
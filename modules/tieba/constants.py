@@ -20,3 +20,12 @@ DOWNLOAD_HEADERS = {
 TIMEOUT = 30
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+
+# 按热度排序时：除第 1 页外额外并发获取的页数，以及整体耗时上限（秒）
+HOT_EXTRA_PAGES = 3
+HOT_TIME_BUDGET = 8
+
+# 未登录获取的 tbs 可复用一段时间
+TBS_TTL = 1800
+# protobuf 第 1 页超过该时间（秒）未返回时提前发起 JSON 请求
+JSON_HEDGE_DELAY = 3
@@ -6,17 +6,22 @@ import httpx
 
 from astrbot.api import logger
 
+from ..stream_download import IMAGE_MAX_BYTES, download_in_waves, stream_to_file
 from .constants import DOWNLOAD_HEADERS, IMAGE_EXTS, TIMEOUT
 from .model import TiebaParseResult
 
 
 class TiebaDownloader:
-    def __init__(self, download_dir: str, max_images: int = 20):
+    def __init__(self, download_dir: str, max_images: int = 20, max_size: float = 200):
         self.download_dir = download_dir
         self.max_images = max_images
+        # 视频单文件上限（MB），float("inf") 表示不限制
+        self.max_size = max_size
         os.makedirs(self.download_dir, exist_ok=True)
 
-    async def _download_file(self, url: str, ext_hint: str = "") -> str | None:
+    async def _download_file(
+        self, url: str, ext_hint: str = "", max_bytes: float = IMAGE_MAX_BYTES
+    ) -> str | None:
         parsed = urlparse(url)
         path = unquote(parsed.path)
         _, ext = os.path.splitext(path)
@@ -30,13 +35,9 @@ class TiebaDownloader:
             return dest
         try:
             async with httpx.AsyncClient(
-                timeout=TIMEOUT, headers=DOWNLOAD_HEADERS
+                timeout=TIMEOUT, headers=DOWNLOAD_HEADERS, follow_redirects=True
             ) as cli:
-                resp = await cli.get(url, follow_redirects=True)
-                resp.raise_for_status()
-                content = resp.content
-            with open(dest, "wb") as f:
-                f.write(content)
+                await stream_to_file(cli, url, dest, max_bytes=max_bytes)
             return dest
         except Exception as e:
             logger.error(f"贴吧下载失败: {url} -> {e}")
@@ -57,7 +58,9 @@ class TiebaDownloader:
         }
 
         if parse_result.media_type == "video" and parse_result.video_url:
-            video_path = await self._download_file(parse_result.video_url)
+            video_path = await self._download_file(
+                parse_result.video_url, max_bytes=self.max_size * 1024 * 1024
+            )
             if video_path:
                 result["video_path"] = video_path
                 result["type"] = "video"
@@ -65,41 +68,32 @@ class TiebaDownloader:
                 result["error"] = "视频下载失败"
             return result
 
-        downloaded = 0
-
-        for item in parse_result.media_items:
-            if downloaded >= self.max_images:
-                break
-            for candidate_url in [item.url, item.thumb_url]:
-                if not candidate_url:
-                    continue
-                path = await self._download_file(candidate_url)
+        # 先按楼层顺序列出全部媒体，并发下载后再放回对应位置
+        floors = [parse_result.media_items] + [
+            reply.media_items for reply in parse_result.replies
+        ]
+        candidates = [[item.url, item.thumb_url] for items in floors for item in items]
+        paths = iter(
+            await download_in_waves(candidates, self._download_file, self.max_images)
+        )
+        floor_media = []
+        for items in floors:
+            media = []
+            for _ in items:
+                path = next(paths)
                 if path:
-                    result.setdefault("ordered_media", []).append(
-                        {"path": path, "type": "image"}
-                    )
-                    downloaded += 1
-                    break
+                    media.append({"path": path, "type": "image"})
+            floor_media.append(media)
 
-        for reply in parse_result.replies:
+        result["ordered_media"] = floor_media[0]
+        for reply, media in zip(parse_result.replies, floor_media[1:]):
             reply_dict = {
                 "floor": reply.floor,
                 "author": reply.author,
                 "content": reply.content,
                 "agree_num": reply.agree_num,
-                "media": [],
+                "media": media,
             }
-            for item in reply.media_items:
-                if downloaded >= self.max_images:
-                    break
-                for candidate_url in [item.url, item.thumb_url]:
-                    if not candidate_url:
-                        continue
-                    path = await self._download_file(candidate_url)
-                    if path:
-                        reply_dict["media"].append({"path": path, "type": "image"})
-                        downloaded += 1
-                        break
             result["replies"].append(reply_dict)
 
         return result
@@ -1,31 +1,38 @@
+import asyncio
 import hashlib
+import heapq
 import re
-from typing import Any
+import time
+from itertools import islice
+from typing import Any, Iterable, Iterator
 
 import httpx
 
 from astrbot.api import logger
 
+from ..async_tasks import discard_task
 from .constants import (
     API_PAGE,
     API_PAGE_PC,
     API_TBS,
     HEADERS,
+    HOT_EXTRA_PAGES,
+    HOT_TIME_BUDGET,
+    JSON_HEDGE_DELAY,
     PAGE_PC_SALT,
     REG_TIEBA,
     SIGN_SALT,
+    TBS_TTL,
     TIMEOUT,
 )
 from .model import TiebaMedia, TiebaParseResult, TiebaReply
 from . import protobuf_helper  # safe, never raises
 
-if protobuf_helper.PROTO_AVAILABLE:
-    from aiotieba.api.get_posts.protobuf.PbPageReqIdl_pb2 import PbPageReqIdl
-    from aiotieba.api.get_posts.protobuf.PbPageResIdl_pb2 import PbPageResIdl
-
-_PROTO_READY = protobuf_helper.PROTO_AVAILABLE
 _PB_API = "https://tiebac.baidu.com/c/f/pb/page?cmd=302001"
 
+# (tbs, 过期时间)
+_TBS_CACHE: tuple[str, float] = ("", 0.0)
+
 
 class TiebaError(Exception):
     def __init__(self, msg: str):
@@ -34,10 +41,18 @@ class TiebaError(Exception):
 
 
 class TiebaParser:
-    def __init__(self, max_replies: int = 20, sort: str = "time"):
+    def __init__(
+        self,
+        max_replies: int = 20,
+        sort: str = "time",
+        hot_pages: int = HOT_EXTRA_PAGES,
+    ):
         self.max_replies = max_replies
         self.sort = sort
+        self.hot_pages = max(0, hot_pages)
         self._proxy: str | None = None
+        # protobuf 第 1 页返回时置位，用于判断是否需要提前发起 JSON 请求
+        self._first_page = asyncio.Event()
 
     @staticmethod
     def match(url: str) -> bool:
@@ -79,19 +94,31 @@ class TiebaParser:
             return info.get("name_show", "") or info.get("name", "")
         return info.name_show or info.name
 
+    def _select_replies(self, replies: Iterable[TiebaReply]) -> list[TiebaReply]:
+        """按时间取前 max_replies 条；按热度时用有界堆保留点赞数最高的 max_replies 条。"""
+        if self.sort != "hot":
+            return list(islice(replies, self.max_replies))
+        if self.max_replies <= 0:
+            return []
+        heap: list[tuple[int, int, TiebaReply]] = []
+        for order, reply in enumerate(replies):
+            # 点赞数相同时楼层靠前的优先
+            entry = (reply.agree_num, -order, reply)
+            if len(heap) < self.max_replies:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+        return [reply for *_, reply in sorted(heap, reverse=True)]
+
     # ── protobuf path ─────────────────────────────────────────
 
-    async def _fetch_protobuf(self, url: str) -> Any:
-        kz = int(self.get_kz(url))
-        req = PbPageReqIdl()
+    async def _fetch_protobuf_page(self, kz: int, pn: int, rn: int) -> Any:
+        req = protobuf_helper.PbPageReqIdl()
         req.data.common._client_type = 2
         req.data.common._client_version = "12.64.1.1"
         req.data.kz = kz
-        req.data.pn = 1
-        if self.sort == "hot":
-            req.data.rn = max(30, int(self.max_replies * 1.5))
-        else:
-            req.data.rn = 30
+        req.data.pn = pn
+        req.data.rn = rn
         req.data.r = 0
         req.data.lz = 0
         req.data.with_floor = 1
@@ -118,16 +145,90 @@ class TiebaParser:
                     "x_bd_data_type": "protobuf",
                 },
             )
-        res = PbPageResIdl()
+        res = protobuf_helper.PbPageResIdl()
         res.ParseFromString(resp.content)
         if res.error.errorno:
             msg = res.error.errormsg or "获取帖子内容失败"
             raise TiebaError(msg)
         return res.data
 
-    def _parse_protobuf(self, data) -> TiebaParseResult:
+    async def _fetch_protobuf(self, url: str) -> list[Any]:
+        """返回按页码排列的各页数据；按热度排序时在时间预算内并发获取后续页。"""
+        kz = int(self.get_kz(url))
+        if self.sort != "hot":
+            return [await self._fetch_protobuf_page(kz, 1, 30)]
+
+        rn = max(30, int(self.max_replies * 1.5))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first = await self._fetch_protobuf_page(kz, 1, rn)
+        self._first_page.set()
+        last_page = min(first.page.total_page, 1 + self.hot_pages)
+        if last_page <= 1:
+            return [first]
+
+        tasks = [
+            asyncio.ensure_future(self._fetch_protobuf_page(kz, pn, rn))
+            for pn in range(2, last_page + 1)
+        ]
+        remaining = HOT_TIME_BUDGET - (loop.time() - started)
+        done, pending = await asyncio.wait(tasks, timeout=max(0, remaining))
+        for task in pending:
+            task.cancel()
+
+        pages = [first]
+        for pn, task in enumerate(tasks, start=2):
+            if task not in done:
+                continue
+            if task.exception():
+                logger.debug(f"贴吧第 {pn} 页获取失败: {task.exception()}")
+                continue
+            pages.append(task.result())
+        logger.debug(
+            f"贴吧热度排序：共 {first.page.total_page} 页，获取 {len(pages)} 页，"
+            f"{len(pending)} 页超出时间预算，用时 {loop.time() - started:.2f}s"
+        )
+        return pages
+
+    def _iter_protobuf_replies(
+        self, pages: list[Any], user_map: dict[int, str]
+    ) -> Iterator[TiebaReply]:
+        seen: set[int] = set()
+        for index, page in enumerate(pages):
+            posts = list(page.post_list)
+            # 只有第 1 页的首条是楼主
+            for post in posts[1:] if index == 0 else posts:
+                if post.floor == 1 or (post.id and post.id in seen):
+                    continue
+                seen.add(post.id)
+                r_content = self._extract_content(post.content)
+                if not r_content.strip():
+                    continue
+                r_media: list[TiebaMedia] = []
+                for c in post.content:
+                    if c.type == 3:
+                        src = (
+                            c.origin_src or c.big_cdn_src or c.cdn_src or c.src or ""
+                        ).strip()
+                        if src:
+                            if src.startswith("http://"):
+                                src = "https://" + src[7:]
+                            r_media.append(TiebaMedia(url=src))
+                yield TiebaReply(
+                    floor=post.floor or 0,
+                    author=user_map.get(post.author_id, ""),
+                    content=r_content,
+                    agree_num=post.agree.agree_num if post.HasField("agree") else 0,
+                    media_items=r_media,
+                )
+
+    def _parse_protobuf(self, pages: list[Any]) -> TiebaParseResult:
+        data = pages[0]
         user_map: dict[int, str] = {
-            u.id: self._extract_author_name(u) for u in data.user_list if u.id
+            u.id: self._extract_author_name(u)
+            for page in pages
+            for u in page.user_list
+            if u.id
         }
         post_list = list(data.post_list)
         if not post_list:
@@ -155,39 +256,7 @@ class TiebaParser:
                     media_items.append(TiebaMedia(url=src))
                     image_urls.append(src)
 
-        all_replies: list[TiebaReply] = []
-        for post in post_list[1:]:
-            floor = post.floor or 0
-            r_content = self._extract_content(post.content)
-            if not r_content.strip():
-                continue
-            if len(all_replies) >= self.max_replies and self.sort != "hot":
-                break
-            r_author = user_map.get(post.author_id, "")
-            r_agree_num = post.agree.agree_num if post.HasField("agree") else 0
-            r_media: list[TiebaMedia] = []
-            for c in post.content:
-                if c.type == 3:
-                    src = (
-                        c.origin_src or c.big_cdn_src or c.cdn_src or c.src or ""
-                    ).strip()
-                    if src:
-                        if src.startswith("http://"):
-                            src = "https://" + src[7:]
-                        r_media.append(TiebaMedia(url=src))
-            all_replies.append(
-                TiebaReply(
-                    floor=floor,
-                    author=r_author,
-                    content=r_content,
-                    agree_num=r_agree_num,
-                    media_items=r_media,
-                )
-            )
-
-        if self.sort == "hot":
-            all_replies.sort(key=lambda r: r.agree_num, reverse=True)
-        replies = all_replies[: self.max_replies]
+        replies = self._select_replies(self._iter_protobuf_replies(pages, user_map))
 
         return TiebaParseResult(
             success=True,
@@ -215,11 +284,16 @@ class TiebaParser:
         return hashlib.md5((base_str + salt).encode("utf-8")).hexdigest()
 
     async def _fetch_tbs(self) -> str:
+        global _TBS_CACHE
+        tbs, expires = _TBS_CACHE
+        if tbs and time.time() < expires:
+            return tbs
         async with httpx.AsyncClient(proxy=self._proxy, headers=HEADERS) as cli:
             resp = await cli.get(API_TBS)
             resp.raise_for_status()
             data = resp.json()
         if tbs := data.get("tbs"):
+            _TBS_CACHE = (str(tbs), time.time() + TBS_TTL)
             return str(tbs)
         raise TiebaError("获取 tbs 失败")
 
@@ -263,8 +337,10 @@ class TiebaParser:
         async with httpx.AsyncClient(
             proxy=self._proxy, timeout=TIMEOUT, headers=HEADERS
         ) as cli:
-            r1 = await cli.post(API_PAGE, data=page_data)
-            r2 = await cli.post(API_PAGE_PC, data=pc_data)
+            r1, r2 = await asyncio.gather(
+                cli.post(API_PAGE, data=page_data),
+                cli.post(API_PAGE_PC, data=pc_data),
+            )
             result_page: dict[str, Any] = r1.json()
             result_pc: dict[str, Any] = r2.json()
 
@@ -352,9 +428,7 @@ class TiebaParser:
                 )
             )
 
-        if self.sort == "hot":
-            all_replies.sort(key=lambda r: r.agree_num, reverse=True)
-        replies = all_replies[: self.max_replies]
+        replies = self._select_replies(all_replies)
 
         return TiebaParseResult(
             success=True,
@@ -376,17 +450,34 @@ class TiebaParser:
     # ── main ──────────────────────────────────────────────────
 
     async def parse(self, url: str) -> TiebaParseResult:
-        if _PROTO_READY:
+        json_task: asyncio.Task | None = None
+        if await protobuf_helper.ensure_loaded():
+            proto_task = asyncio.ensure_future(self._fetch_protobuf(url))
+            first_page = asyncio.ensure_future(self._first_page.wait())
+            await asyncio.wait(
+                {proto_task, first_page},
+                timeout=JSON_HEDGE_DELAY,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            first_page.cancel()
+            if not proto_task.done() and not self._first_page.is_set():
+                logger.debug(
+                    f"贴吧 protobuf {JSON_HEDGE_DELAY}s 内未返回，提前发起 JSON 请求"
+                )
+                json_task = asyncio.ensure_future(self._fetch_json(url))
             try:
-                data = await self._fetch_protobuf(url)
-                return self._parse_protobuf(data)
+                pages = await proto_task
+                result = self._parse_protobuf(pages)
+                if json_task:
+                    discard_task(json_task)
+                return result
             except TiebaError:
                 logger.warning("贴吧 protobuf 解析失败，降级到 JSON")
             except Exception as e:
                 logger.warning(f"贴吧 protobuf 异常，降级到 JSON: {e}")
 
         try:
-            raw = await self._fetch_json(url)
+            raw = await (json_task or self._fetch_json(url))
             return self._parse_json(raw)
         except TiebaError as e:
             return TiebaParseResult(success=False, error=e.msg)
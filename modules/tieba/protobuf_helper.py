@@ -1,13 +1,18 @@
-import importlib.machinery
-import importlib.util
+import asyncio
+import importlib
 import os
 import sys
+import threading
 import types
 
 _PROTO_DIR = os.path.join(os.path.dirname(__file__), "proto")
 
-# Public flag: check this in parser.py
-PROTO_AVAILABLE = False
+# None: 尚未加载；True/False: 加载结果
+PROTO_AVAILABLE: bool | None = None
+PbPageReqIdl = None
+PbPageResIdl = None
+
+_LOAD_LOCK = threading.Lock()
 
 
 def _clean_sys_modules():
@@ -16,17 +21,21 @@ def _clean_sys_modules():
         del sys.modules[k]
 
 
-def _bootstrap():
-    global PROTO_AVAILABLE
+def _bootstrap() -> bool:
+    """
+    注册 aiotieba 包结构后只导入 PbPageReqIdl / PbPageResIdl，
+    其依赖的 _protobuf 描述文件由相对导入按需加载。
+    """
+    global PbPageReqIdl, PbPageResIdl
 
     try:
         import google.protobuf  # noqa: F401
     except ImportError:
-        return
+        return False
 
     src_dir = os.path.abspath(_PROTO_DIR)
     if not os.path.isdir(os.path.join(src_dir, "aiotieba", "api", "_protobuf")):
-        return
+        return False
 
     aiotieba_dir = os.path.join(src_dir, "aiotieba")
     api_dir = os.path.join(aiotieba_dir, "api")
@@ -47,27 +56,32 @@ def _bootstrap():
             sys.modules[pkg_name] = mod
 
     try:
-        for src_root, mod_prefix in (
-            (proto_dir, "aiotieba.api._protobuf"),
-            (posts_proto_dir, "aiotieba.api.get_posts.protobuf"),
-        ):
-            for f_name in sorted(os.listdir(src_root)):
-                if not f_name.endswith("_pb2.py") or f_name.startswith("_"):
-                    continue
-                mod_name = f"{mod_prefix}.{f_name[:-3]}"
-                if mod_name not in sys.modules:
-                    loader = importlib.machinery.SourceFileLoader(
-                        mod_name,
-                        os.path.join(src_root, f_name),
-                    )
-                    spec = importlib.util.spec_from_loader(mod_name, loader)
-                    mod = importlib.util.module_from_spec(spec)
-                    sys.modules[mod_name] = mod
-                    loader.exec_module(mod)
-
-        PROTO_AVAILABLE = True
+        req_mod = importlib.import_module(
+            "aiotieba.api.get_posts.protobuf.PbPageReqIdl_pb2"
+        )
+        res_mod = importlib.import_module(
+            "aiotieba.api.get_posts.protobuf.PbPageResIdl_pb2"
+        )
     except Exception:
         _clean_sys_modules()
+        return False
+
+    PbPageReqIdl = req_mod.PbPageReqIdl
+    PbPageResIdl = res_mod.PbPageResIdl
+    return True
+
+
+def load() -> bool:
+    """同步加载 protobuf 描述（只执行一次），返回是否可用。"""
+    global PROTO_AVAILABLE
+    with _LOAD_LOCK:
+        if PROTO_AVAILABLE is None:
+            PROTO_AVAILABLE = _bootstrap()
+    return PROTO_AVAILABLE
 
 
-_bootstrap()
+async def ensure_loaded() -> bool:
+    """首次解析贴吧时在线程中加载 protobuf，避免阻塞事件循环。"""
+    if PROTO_AVAILABLE is not None:
+        return PROTO_AVAILABLE
+    return await asyncio.to_thread(load)
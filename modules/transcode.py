@@ -0,0 +1,197 @@
+"""
+超限视频本地转码
+
+按时长与剩余体积预算计算目标码率，用 ffmpeg 将已下载的视频重新编码到限制以内。
+同时运行的 ffmpeg 任务数受 TRANSCODE_MAX_JOBS 限制。
+"""
+
+import asyncio
+import os
+import re
+import shutil
+
+from astrbot.api import logger
+
+TRANSCODE_MAX_JOBS = 1
+TRANSCODE_TIMEOUT = 900
+# 预留给容器开销与码率波动的余量
+TRANSCODE_SIZE_MARGIN = 0.92
+TRANSCODE_AUDIO_KBPS = 96
+# 视频码率低于此值时画面已不可用，放弃转码
+TRANSCODE_MIN_VIDEO_KBPS = 150
+# 源文件超过预算的此倍数时不再转码（也是已无法降级时允许下载的体积上限）
+TRANSCODE_MAX_INPUT_RATIO = 4
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_SEMAPHORE: asyncio.Semaphore | None = None
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _SEMAPHORE
+    if _SEMAPHORE is None:
+        _SEMAPHORE = asyncio.Semaphore(TRANSCODE_MAX_JOBS)
+    return _SEMAPHORE
+
+
+def can_transcode() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def target_video_kbps(duration: float, max_bytes: int) -> int:
+    """在 max_bytes 预算内扣除音频后可用的视频码率（kbps）。"""
+    if duration <= 0:
+        return 0
+    total_kbps = max_bytes * 8 * TRANSCODE_SIZE_MARGIN / duration / 1000
+    return int(total_kbps - TRANSCODE_AUDIO_KBPS)
+
+
+def _scale_height(video_kbps: int) -> int:
+    if video_kbps < 400:
+        return 480
+    if video_kbps < 1000:
+        return 720
+    return 1080
+
+
+async def probe_duration(path: str) -> float:
+    """从 ffmpeg -i 的输出中读取时长（秒），失败返回 0。"""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner",
+        "-i",
+        path,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr_data = await process.communicate()
+    match = _DURATION_RE.search(stderr_data.decode(errors="ignore"))
+    if not match:
+        return 0.0
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+async def transcode_to_fit(
+    src_path: str,
+    dest_path: str,
+    max_bytes: int,
+    duration: float = 0,
+) -> str | None:
+    """
+    将 src_path 转码为不超过 max_bytes 的 MP4，成功返回 dest_path。
+    无 ffmpeg、源文件过大、时长未知、预算过低或转码后仍超限时返回 None。
+    """
+    if not can_transcode():
+        logger.debug("未找到 ffmpeg，跳过转码")
+        return None
+    src_size = os.path.getsize(src_path)
+    if src_size > max_bytes * TRANSCODE_MAX_INPUT_RATIO:
+        logger.info(
+            f"源文件 {src_size / 1024 / 1024:.1f}MB 超出预算 "
+            f"{TRANSCODE_MAX_INPUT_RATIO} 倍，放弃转码"
+        )
+        return None
+    if duration <= 0:
+        duration = await probe_duration(src_path)
+    video_kbps = target_video_kbps(duration, max_bytes)
+    if video_kbps < TRANSCODE_MIN_VIDEO_KBPS:
+        logger.info(
+            f"转码预算不足（时长 {duration:.0f}s，视频码率仅 {video_kbps}kbps），放弃转码"
+        )
+        return None
+
+    height = _scale_height(video_kbps)
+    part_path = f"{dest_path}.part"
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-i",
+        src_path,
+        "-vf",
+        f"scale=-2:'min({height},ih)'",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-b:v",
+        f"{video_kbps}k",
+        "-maxrate",
+        f"{int(video_kbps * 1.2)}k",
+        "-bufsize",
+        f"{video_kbps * 2}k",
+        "-c:a",
+        "aac",
+        "-b:a",
+        f"{TRANSCODE_AUDIO_KBPS}k",
+        "-movflags",
+        "+faststart",
+        "-f",
+        "mp4",
+        part_path,
+    ]
+
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        logger.info(
+            f"开始转码以满足大小限制: {os.path.basename(src_path)} -> "
+            f"{video_kbps}kbps / {height}p（预算 {max_bytes / 1024 / 1024:.1f}MB）"
+        )
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr_data = await asyncio.wait_for(
+                process.communicate(), timeout=TRANSCODE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            _kill(process)
+            await process.wait()
+            logger.warning(f"转码超过 {TRANSCODE_TIMEOUT} 秒，已中止")
+            _remove(part_path)
+            return None
+        except BaseException:
+            # 任务被取消时不能留下仍在占用 CPU 的 ffmpeg
+            _kill(process)
+            await asyncio.shield(process.wait())
+            _remove(part_path)
+            raise
+
+    if process.returncode != 0:
+        error_output = stderr_data.decode(errors="ignore").strip()
+        logger.warning(f"转码失败: {error_output[:500]}")
+        _remove(part_path)
+        return None
+
+    size = os.path.getsize(part_path)
+    if size > max_bytes:
+        logger.warning(
+            f"转码后仍超出限制: {size / 1024 / 1024:.2f}MB > {max_bytes / 1024 / 1024:.2f}MB"
+        )
+        _remove(part_path)
+        return None
+
+    os.replace(part_path, dest_path)
+    logger.info(
+        f"转码完成: {size / 1024 / 1024:.2f}MB，用时 {loop.time() - started:.1f}s"
+    )
+    return dest_path
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+
+def _remove(path: str) -> None:
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除临时文件失败 {path}: {e}")
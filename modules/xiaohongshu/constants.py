@@ -24,3 +24,22 @@ DOWNLOAD_HEADERS = {
 }
 
 DEFAULT_TIMEOUT = 30
+
+# HLS 分片下载
+HLS_CONCURRENCY = 6
+HLS_SEGMENT_RETRIES = 3
+# 乱序到达、等待写入的分片最多占用的内存
+HLS_BUFFER_LIMIT = 32 * 1024 * 1024
+
+# 体积相近时优先选择兼容性更好的编码
+XHS_CODEC_ORDER = ("h264", "h265", "av1", "h266")
+ORIGIN_VIDEO_HOST = "https://sns-video-bd.xhscdn.com"
+
+# image_quality=balanced：通过 CDN 参数请求缩放后的 WebP，按长边从大到小尝试
+XHS_IMAGE_EDGES = (2560, 1920, 1440)
+XHS_IMAGE_FORMAT = "webp"
+XHS_IMAGE_QUALITY = 90
+# 单篇笔记全部图片的体积预算
+XHS_IMAGE_BUDGET = 30 * 1024 * 1024
+# 探测图片大小时同时处理的图片数（每张图会并发请求原图与各候选）
+XHS_IMAGE_PROBE_CONCURRENCY = 4
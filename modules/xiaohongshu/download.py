@@ -1,9 +1,6 @@
 import asyncio
 import hashlib
 import os
-import shutil
-import tempfile
-from urllib.parse import urljoin
 
 import aiofiles
 import httpx
@@ -11,13 +8,24 @@ import httpx
 from astrbot.api import logger
 
 from .model import XiaohongshuParseResult
-from .constants import DOWNLOAD_HEADERS, DEFAULT_TIMEOUT
+from .constants import (
+    DOWNLOAD_HEADERS,
+    DEFAULT_TIMEOUT,
+    XHS_IMAGE_BUDGET,
+    XHS_IMAGE_FORMAT,
+    XHS_IMAGE_PROBE_CONCURRENCY,
+)
+from .hls import download_hls
+from .images import pick_image_variant, probe_image_sizes
+from .variants import select_variant
 
 
 class XiaohongshuDownloader:
-    def __init__(self, download_dir: str, max_images: int = 20):
+    def __init__(self, download_dir: str, max_images: int = 20, max_size: float = 200):
         self.download_dir = download_dir
         self.max_images = max_images
+        # 单位 MB，float("inf") 表示不限制
+        self.max_size = max_size
 
     async def download(self, result: XiaohongshuParseResult, url: str) -> dict:
         if not result.success:
@@ -29,19 +37,30 @@ class XiaohongshuDownloader:
 
         ordered_media = []
         img_count = 0
+        image_items = [
+            m for m in result.media_items if m["type"] == "image" and m.get("urls")
+        ]
+        image_plans = await self._plan_images(image_items[: self.max_images])
+        saved_bytes = 0
 
         for i, item in enumerate(result.media_items):
             candidate_urls: list[str] = item.get("urls") or []
             m_type = item["type"]
 
             if m_type == "video":
+                duration = item.get("duration") or 0
+                if item.get("variants"):
+                    chosen = await select_variant(
+                        item["variants"], self._max_bytes(), duration
+                    )
+                    candidate_urls = chosen["urls"]
                 if not candidate_urls:
                     continue
                 v_file = os.path.join(self.download_dir, f"{note_id}.mp4")
                 downloaded = False
                 for v_url in candidate_urls:
                     if os.path.exists(v_file) or await self._download_file(
-                        v_url, v_file
+                        v_url, v_file, duration
                     ):
                         downloaded = True
                         break
@@ -56,31 +75,93 @@ class XiaohongshuDownloader:
                 if not candidate_urls:
                     continue
 
-                ext = ".jpg"
-                img_file = os.path.join(
-                    self.download_dir, f"{note_id}_{img_count}{ext}"
-                )
+                original_size = 0
+                if id(item) in image_plans:
+                    candidate_urls, original_size = image_plans[id(item)]
+                variants = item.get("variants") or []
 
-                downloaded = False
+                img_file = None
                 for img_url in candidate_urls:
-                    if os.path.exists(img_file) or await self._download_file(
-                        img_url, img_file
-                    ):
-                        downloaded = True
+                    # 扩展名取决于实际下载成功的地址：候选为 WebP，原图按其自身格式
+                    path = os.path.join(
+                        self.download_dir,
+                        f"{note_id}_{img_count}{self._image_ext(img_url, variants)}",
+                    )
+                    if os.path.exists(path) or await self._download_file(img_url, path):
+                        img_file = path
                         break
 
-                if downloaded:
+                if img_file:
                     ordered_media.append({"path": img_file, "type": "image"})
                     img_count += 1
+                    size = os.path.getsize(img_file)
+                    if original_size > size:
+                        saved_bytes += original_size - size
+
+        if saved_bytes:
+            logger.info(
+                f"XHS 图片使用 CDN 压缩版，共节省 {saved_bytes / 1024 / 1024:.2f}MB"
+            )
 
         if not ordered_media:
             return {"error": "没有下载到任何媒体文件"}
 
         return self._build_result(result, url, ordered_media)
 
-    async def _download_file(self, url: str, save_path: str) -> bool:
+    async def _plan_images(self, items: list[dict]) -> dict[int, tuple[list[str], int]]:
+        """
+        为带候选的图片并发探测大小，再按顺序分配单篇预算。
+        返回 id(item) -> (依次尝试的地址, 原图大小)。
+        """
+        items = [item for item in items if item.get("variants")]
+        if not items:
+            return {}
+        semaphore = asyncio.Semaphore(XHS_IMAGE_PROBE_CONCURRENCY)
+
+        async def probe(item: dict) -> tuple[int, list[int]]:
+            async with semaphore:
+                return await probe_image_sizes(item["variants"], item["urls"][0])
+
+        probes = await asyncio.gather(*(probe(item) for item in items))
+
+        plans: dict[int, tuple[list[str], int]] = {}
+        budget = XHS_IMAGE_BUDGET
+        for index, (item, (original_size, variant_sizes)) in enumerate(
+            zip(items, probes)
+        ):
+            urls = item["urls"]
+            # 剩余预算平均分给尚未分配的图片
+            share = budget / (len(items) - index)
+            chosen, expected = pick_image_variant(
+                item["variants"], urls[0], original_size, variant_sizes, share
+            )
+            budget -= expected
+            logger.debug(
+                f"XHS 图片 {index}: 预计 {expected / 1024:.0f}KB，"
+                f"原图 {original_size / 1024:.0f}KB"
+            )
+            if chosen != urls[0]:
+                urls = [chosen, *urls]
+            plans[id(item)] = (urls, original_size)
+        return plans
+
+    @staticmethod
+    def _image_ext(url: str, variants: list[str]) -> str:
+        if url in variants:
+            return f".{XHS_IMAGE_FORMAT}"
+        path_ext = os.path.splitext(url.split("?", 1)[0])[1].lower()
+        if path_ext in (".jpg", ".jpeg", ".png", ".gif", ".webp"):
+            return path_ext
+        return ".jpg"
+
+    def _max_bytes(self) -> float:
+        return self.max_size * 1024 * 1024
+
+    async def _download_file(
+        self, url: str, save_path: str, duration: float = 0
+    ) -> bool:
         if ".m3u8" in url.lower():
-            return await self._download_m3u8(url, save_path)
+            return await self._download_m3u8(url, save_path, duration)
         for attempt in range(2):
             try:
                 async with httpx.AsyncClient(
@@ -104,107 +185,10 @@ class XiaohongshuDownloader:
                     os.remove(save_path)
         return False
 
-    async def _download_m3u8(self, m3u8_url: str, output_path: str) -> bool:
-        try:
-            async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, verify=False) as c:
-                r = await c.get(m3u8_url, headers=DOWNLOAD_HEADERS, follow_redirects=True)
-                r.raise_for_status()
-                playlist = r.text
-        except Exception as e:
-            logger.warning(f"XHS M3U8 获取失败: {m3u8_url}, {e}")
-            return False
-
-        base = m3u8_url.rsplit("/", 1)[0] + "/" if "/" in m3u8_url else ""
-
-        # Handle master playlist (multi-variant) — pick highest bandwidth
-        if "#EXT-X-STREAM-INF" in playlist:
-            variants = []
-            lines = playlist.splitlines()
-            i = 0
-            while i < len(lines):
-                line = lines[i]
-                if line.startswith("#EXT-X-STREAM-INF:"):
-                    params_str = line[len("#EXT-X-STREAM-INF:") :]
-                    bw = 0
-                    for part in params_str.split(","):
-                        part = part.strip()
-                        if part.upper().startswith("BANDWIDTH="):
-                            bw = int(part.split("=", 1)[1].strip())
-                    j = i + 1
-                    while j < len(lines) and (
-                        not lines[j].strip() or lines[j].strip().startswith("#")
-                    ):
-                        j += 1
-                    if j < len(lines):
-                        variants.append((bw, lines[j].strip()))
-                    i = j
-                else:
-                    i += 1
-            if not variants:
-                logger.warning("XHS M3U8 主播放列表无可用变体")
-                return False
-            variants.sort(key=lambda v: v[0], reverse=True)
-            best_uri = urljoin(base, variants[0][1])
-            logger.debug(f"XHS M3U8 选择最高码率变体: {variants[0][0]} bps")
-            return await self._download_m3u8(best_uri, output_path)
-
-        # Media playlist — download segments
-        seg_urls = [
-            urljoin(base, line.strip())
-            for line in playlist.splitlines()
-            if line.strip() and not line.strip().startswith("#")
-        ]
-
-        if not seg_urls:
-            logger.warning(f"XHS M3U8 无分片: {m3u8_url}")
-            return False
-
-        tmpdir = tempfile.mkdtemp(prefix="xhs_m3u8_")
-        seg_files = []
-        try:
-            for i, seg_url in enumerate(seg_urls):
-                seg_path = os.path.join(tmpdir, f"seg_{i:05d}.ts")
-                for attempt in range(2):
-                    try:
-                        async with httpx.AsyncClient(
-                            timeout=DEFAULT_TIMEOUT, verify=False
-                        ) as c:
-                            resp = await c.get(
-                                seg_url, headers=DOWNLOAD_HEADERS, follow_redirects=True
-                            )
-                            resp.raise_for_status()
-                            async with aiofiles.open(seg_path, "wb") as f:
-                                async for chunk in resp.aiter_bytes():
-                                    await f.write(chunk)
-                        seg_files.append(seg_path)
-                        break
-                    except Exception as e:
-                        logger.warning(
-                            f"XHS M3U8 分片 {i} 下载失败 (attempt {attempt + 1}): {seg_url}, {e}"
-                        )
-                        if attempt == 0:
-                            await asyncio.sleep(1)
-                        if os.path.exists(seg_path):
-                            os.remove(seg_path)
-                else:
-                    raise RuntimeError(f"分片 {i} 下载失败")
-
-            async with aiofiles.open(output_path, "wb") as out:
-                for seg_path in seg_files:
-                    async with aiofiles.open(seg_path, "rb") as inp:
-                        while True:
-                            chunk = await inp.read(65536)
-                            if not chunk:
-                                break
-                            await out.write(chunk)
-            return True
-        except Exception as e:
-            logger.warning(f"XHS M3U8 拼接失败: {e}")
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            return False
-        finally:
-            shutil.rmtree(tmpdir, ignore_errors=True)
+    async def _download_m3u8(
+        self, m3u8_url: str, output_path: str, duration: float = 0
+    ) -> bool:
+        return await download_hls(m3u8_url, output_path, self._max_bytes(), duration)
 
     @staticmethod
     def _build_result(
@@ -217,7 +201,7 @@ class XiaohongshuDownloader:
                 "url": url,
                 "video_path": ordered_media[0]["path"],
                 "type": "video",
-                "duration": 0,
+                "duration": result.duration,
             }
 
         return {
@@ -0,0 +1,279 @@
+"""
+HLS (m3u8) 下载
+
+- 分片通过共享连接池并发下载，并发数受 HLS_CONCURRENCY 限制
+- 按顺序重组后直接写入输出文件，不落临时分片
+- 乱序到达的分片暂存在内存中，总量超过 HLS_BUFFER_LIMIT 时暂停领取新分片
+- 单个分片失败时按退避重试，全部重试失败则整个下载失败
+"""
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+import aiofiles
+
+from astrbot.api import logger
+
+from ..http_pool import get_http_client
+from .constants import (
+    DEFAULT_TIMEOUT,
+    DOWNLOAD_HEADERS,
+    HLS_BUFFER_LIMIT,
+    HLS_CONCURRENCY,
+    HLS_SEGMENT_RETRIES,
+    XHS_CODEC_ORDER,
+)
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+# CODECS 属性中的视频编码前缀
+_HLS_CODEC_PREFIXES = {
+    "avc1": "h264",
+    "avc3": "h264",
+    "hvc1": "h265",
+    "hev1": "h265",
+    "av01": "av1",
+    "vvc1": "h266",
+}
+
+
+class HlsDownloadError(Exception):
+    pass
+
+
+@dataclass
+class HlsVariant:
+    uri: str
+    bandwidth: int = 0
+    codecs: str = ""
+    height: int = 0
+
+    @property
+    def codec(self) -> str:
+        for item in self.codecs.split(","):
+            codec = _HLS_CODEC_PREFIXES.get(item.strip()[:4])
+            if codec:
+                return codec
+        return ""
+
+    @property
+    def codec_rank(self) -> int:
+        codec = self.codec
+        return XHS_CODEC_ORDER.index(codec) if codec else len(XHS_CODEC_ORDER)
+
+
+def _parse_attrs(text: str) -> dict[str, str]:
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(text)}
+
+
+def parse_master_playlist(playlist: str, base_url: str) -> list[HlsVariant]:
+    """解析主播放列表中的全部变体，URI 解析为绝对地址。"""
+    variants = []
+    attrs: dict[str, str] | None = None
+    for line in playlist.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = _parse_attrs(line[len("#EXT-X-STREAM-INF:") :])
+        elif line and not line.startswith("#") and attrs is not None:
+            resolution = attrs.get("RESOLUTION", "")
+            height = resolution.split("x")[-1] if "x" in resolution else ""
+            variants.append(
+                HlsVariant(
+                    uri=urljoin(base_url, line),
+                    bandwidth=int(attrs.get("BANDWIDTH", 0) or 0),
+                    codecs=attrs.get("CODECS", ""),
+                    height=int(height) if height.isdigit() else 0,
+                )
+            )
+            attrs = None
+    return variants
+
+
+def pick_hls_variant(
+    variants: list[HlsVariant], max_bytes: float | None = None, duration: float = 0
+) -> HlsVariant | None:
+    """
+    未给出预算或时长时选择最高码率；否则在 BANDWIDTH × 时长不超出预算的变体中
+    选清晰度最高的（同清晰度优先兼容性好的编码），全部超出时选码率最低的。
+    """
+    if not variants:
+        return None
+    if not max_bytes or max_bytes == float("inf") or duration <= 0:
+        return max(variants, key=lambda v: v.bandwidth)
+    fitting = [v for v in variants if v.bandwidth * duration / 8 <= max_bytes]
+    if not fitting:
+        return min(variants, key=lambda v: v.bandwidth)
+    return max(fitting, key=lambda v: (v.height, -v.codec_rank, v.bandwidth))
+
+
+def parse_media_playlist(playlist: str, base_url: str) -> list[str]:
+    """返回媒体播放列表的分片地址（含 EXT-X-MAP 初始化分片）。"""
+    segments = []
+    for line in playlist.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-MAP:"):
+            uri = _parse_attrs(line[len("#EXT-X-MAP:") :]).get("URI")
+            if uri and not segments:
+                segments.append(urljoin(base_url, uri))
+        elif line.startswith("#EXT-X-KEY:"):
+            method = _parse_attrs(line[len("#EXT-X-KEY:") :]).get("METHOD", "NONE")
+            if method.upper() != "NONE":
+                raise HlsDownloadError(f"不支持加密的 HLS 分片（{method}）")
+        elif line and not line.startswith("#"):
+            segments.append(urljoin(base_url, line))
+    return segments
+
+
+def playlist_duration(playlist: str) -> float:
+    """媒体播放列表中 #EXTINF 时长之和（秒）。"""
+    total = 0.0
+    for line in playlist.splitlines():
+        if line.startswith("#EXTINF:"):
+            try:
+                total += float(line[len("#EXTINF:") :].split(",", 1)[0])
+            except ValueError:
+                pass
+    return total
+
+
+async def fetch_playlist(url: str) -> str:
+    client = get_http_client()
+    resp = await client.get(url, headers=DOWNLOAD_HEADERS, timeout=DEFAULT_TIMEOUT)
+    resp.raise_for_status()
+    return resp.text
+
+
+async def _fetch_segment(url: str, index: int) -> bytes:
+    client = get_http_client()
+    for attempt in range(HLS_SEGMENT_RETRIES):
+        try:
+            resp = await client.get(
+                url, headers=DOWNLOAD_HEADERS, timeout=DEFAULT_TIMEOUT
+            )
+            resp.raise_for_status()
+            return resp.content
+        except Exception as e:
+            logger.warning(
+                f"XHS M3U8 分片 {index} 下载失败 (attempt {attempt + 1}): {url}, {e}"
+            )
+            if attempt + 1 < HLS_SEGMENT_RETRIES:
+                await asyncio.sleep(0.5 * 2**attempt)
+    raise HlsDownloadError(f"分片 {index} 下载失败")
+
+
+async def download_segments(
+    segments: list[str],
+    output_path: str,
+    concurrency: int = HLS_CONCURRENCY,
+    buffer_limit: int = HLS_BUFFER_LIMIT,
+) -> int:
+    """并发下载分片并按顺序写入 output_path，返回写入的字节数。"""
+    total = len(segments)
+    pending: dict[int, bytes] = {}
+    cond = asyncio.Condition()
+    next_index = 0
+    buffered = 0
+    written = 0
+    indices = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal buffered
+        for index in indices:
+            # 内存已满时只允许下载正在等待写入的那个分片，保证总能继续推进
+            async with cond:
+                await cond.wait_for(
+                    lambda: buffered <= buffer_limit or index == next_index
+                )
+            data = await _fetch_segment(segments[index], index)
+            async with cond:
+                pending[index] = data
+                buffered += len(data)
+                cond.notify_all()
+
+    async def writer() -> None:
+        nonlocal next_index, buffered, written
+        async with aiofiles.open(output_path, "wb") as out:
+            while next_index < total:
+                async with cond:
+                    await cond.wait_for(lambda: next_index in pending)
+                    data = pending.pop(next_index)
+                await out.write(data)
+                async with cond:
+                    buffered -= len(data)
+                    written += len(data)
+                    next_index += 1
+                    cond.notify_all()
+
+    tasks = [
+        asyncio.ensure_future(worker()) for _ in range(max(1, min(concurrency, total)))
+    ]
+    tasks.append(asyncio.ensure_future(writer()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return written
+
+
+async def download_hls(
+    m3u8_url: str,
+    output_path: str,
+    max_bytes: float | None = None,
+    duration: float = 0,
+) -> bool:
+    """下载 m3u8 到 output_path；主播放列表按 pick_hls_variant 选择变体。"""
+    try:
+        playlist = await fetch_playlist(m3u8_url)
+    except Exception as e:
+        logger.warning(f"XHS M3U8 获取失败: {m3u8_url}, {e}")
+        return False
+
+    if "#EXT-X-STREAM-INF" in playlist:
+        variants = parse_master_playlist(playlist, m3u8_url)
+        if not variants:
+            logger.warning("XHS M3U8 主播放列表无可用变体")
+            return False
+        if max_bytes and max_bytes != float("inf") and duration <= 0:
+            # 各变体时长一致，读取任一媒体播放列表即可
+            try:
+                duration = playlist_duration(await fetch_playlist(variants[0].uri))
+            except Exception as e:
+                logger.debug(f"XHS M3U8 读取时长失败: {e}")
+        best = pick_hls_variant(variants, max_bytes, duration)
+        logger.debug(
+            f"XHS M3U8 选择变体: {best.bandwidth} bps {best.codec or '未知编码'}"
+            f" {best.height}p"
+        )
+        return await download_hls(best.uri, output_path)
+
+    try:
+        segments = parse_media_playlist(playlist, m3u8_url)
+    except HlsDownloadError as e:
+        logger.warning(f"XHS M3U8 无法下载: {e}")
+        return False
+    if not segments:
+        logger.warning(f"XHS M3U8 无分片: {m3u8_url}")
+        return False
+
+    part_path = f"{output_path}.part"
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        written = await download_segments(segments, part_path)
+        os.replace(part_path, output_path)
+    except Exception as e:
+        logger.warning(f"XHS M3U8 下载失败: {e}")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return False
+
+    elapsed = loop.time() - started
+    logger.debug(
+        f"XHS M3U8 下载完成: {len(segments)} 个分片，{written / 1024 / 1024:.2f}MB，"
+        f"用时 {elapsed:.1f}s"
+    )
+    return True
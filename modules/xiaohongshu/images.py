@@ -0,0 +1,64 @@
+"""
+小红书图片变体（image_quality=balanced）
+
+原图动辄 5~15MB，而 CDN 可以按 imageView2 参数返回缩放后的 WebP。
+这里按长边 XHS_IMAGE_EDGES 生成候选，下载前并发读取所有图片各候选与原图的大小，
+再在单篇笔记的剩余预算内依次为每张图选择长边最大的候选。
+"""
+
+import asyncio
+
+from astrbot.api import logger
+
+from .constants import XHS_IMAGE_EDGES, XHS_IMAGE_FORMAT, XHS_IMAGE_QUALITY
+from .variants import content_length
+
+
+def image_variant_url(clean_url: str, edge: int) -> str:
+    return (
+        f"{clean_url}?imageView2/2/w/{edge}/h/{edge}"
+        f"/format/{XHS_IMAGE_FORMAT}/q/{XHS_IMAGE_QUALITY}"
+    )
+
+
+def build_image_variants(clean_url: str) -> list[str]:
+    """按长边从大到小排列的 CDN 处理图地址。"""
+    return [image_variant_url(clean_url, edge) for edge in XHS_IMAGE_EDGES]
+
+
+async def probe_image_sizes(
+    variants: list[str], original_url: str
+) -> tuple[int, list[int]]:
+    """并发读取原图与各候选的大小，返回 (原图大小, 候选大小列表)，未知时记为 0。"""
+    sizes = await asyncio.gather(
+        content_length(original_url), *(content_length(u) for u in variants)
+    )
+    return sizes[0], list(sizes[1:])
+
+
+def pick_image_variant(
+    variants: list[str],
+    original_url: str,
+    original_size: int,
+    variant_sizes: list[int],
+    budget: float,
+) -> tuple[str, int]:
+    """
+    按探测到的大小选择候选，返回 (地址, 预计大小)。大小未知时记为 0。
+    原图本身不超过最大候选时直接使用原图。
+    """
+    if original_size and variant_sizes[0] and original_size <= variant_sizes[0]:
+        return original_url, original_size
+
+    known = [(url, size) for url, size in zip(variants, variant_sizes) if size]
+    if not known:
+        return variants[0], 0
+    for url, size in known:
+        if size <= budget:
+            return url, size
+    url, size = min(known, key=lambda item: item[1])
+    logger.debug(
+        f"XHS 图片所有候选均超出剩余预算 {budget / 1024 / 1024:.2f}MB，"
+        f"使用最小的候选（{size / 1024:.0f}KB）"
+    )
+    return url, size
@@ -8,8 +8,17 @@ import httpx
 
 from astrbot.api import logger
 
+from ..short_link import SHORT_LINKS
 from .model import XiaohongshuParseResult
-from .constants import ANDROID_UA, PC_UA, BASE_HEADERS, DEFAULT_TIMEOUT
+from .constants import (
+    ANDROID_UA,
+    PC_UA,
+    BASE_HEADERS,
+    DEFAULT_TIMEOUT,
+    ORIGIN_VIDEO_HOST,
+)
+from .images import build_image_variants
+from .variants import collect_stream_variants
 
 
 _INIT_STATE_RE = re.compile(
@@ -27,9 +36,18 @@ LOGIN_INDICATORS = [
 
 
 class XiaohongshuParser:
-    def __init__(self, cookie: str = "", prefer_original: bool = True):
+    def __init__(
+        self,
+        cookie: str = "",
+        prefer_original: bool = True,
+        image_quality: str = "",
+    ):
         self.cookie = cookie
-        self.prefer_original = prefer_original
+        # image_quality: original | balanced | auto；未指定时沿用 prefer_original
+        self.image_quality = image_quality or (
+            "original" if prefer_original else "auto"
+        )
+        self.prefer_original = self.image_quality != "auto"
 
     async def parse(self, url: str) -> XiaohongshuParseResult:
         resolved_url = await self._resolve_url(url)
@@ -74,39 +92,13 @@ class XiaohongshuParser:
         raw_url = text_match.group(1)
 
         if "xhslink.com" in raw_url:
-            for attempt in range(2):
-                try:
-                    async with httpx.AsyncClient(
-                        timeout=DEFAULT_TIMEOUT, follow_redirects=False
-                    ) as client:
-                        resp = await client.get(
-                            raw_url,
-                            headers={"User-Agent": ANDROID_UA, **BASE_HEADERS},
-                        )
-                    if resp.status_code in (301, 302, 303, 307, 308):
-                        location = resp.headers.get("Location", "")
-                        if location:
-                            return unquote(location)
-                except (
-                    httpx.HTTPError,
-                    httpx.TimeoutException,
-                    httpx.ConnectError,
-                ) as e:
-                    logger.warning(f"XHS 短链接解析失败 (attempt {attempt + 1}): {e}")
-                    if attempt == 0:
-                        await asyncio.sleep(1)
-            # last resort: let httpx follow
-            try:
-                async with httpx.AsyncClient(
-                    timeout=DEFAULT_TIMEOUT, follow_redirects=True
-                ) as client:
-                    resp = await client.get(
-                        raw_url, headers={"User-Agent": ANDROID_UA, **BASE_HEADERS}
-                    )
-                    return str(resp.url)
-            except (httpx.HTTPError, httpx.TimeoutException, httpx.ConnectError) as e:
-                logger.warning(f"XHS 短链接全链跟随失败: {e}")
+            location = await SHORT_LINKS.resolve(
+                raw_url, headers={"User-Agent": ANDROID_UA, **BASE_HEADERS}
+            )
+            if not location:
+                logger.warning(f"XHS 短链接解析失败: {raw_url}")
                 return None
+            return unquote(location)
 
         return self._clean_url(raw_url)
 
@@ -270,23 +262,40 @@ class XiaohongshuParser:
             video_info = note.get("video", {})
             video_url = ""
 
-            # 1) originVideoKey — 无水印原视频
+            capa_duration = video_info.get("capa", {}).get("duration") or 0
+            video_duration = int(capa_duration)
+
+            # 1) originVideoKey — 无水印原视频；2) stream 列表中的各清晰度/编码
+            # 全部作为候选，下载时再按大小限制选择
+            variants = []
             consumer = video_info.get("consumer", {})
             origin_key = consumer.get("originVideoKey", "")
             if origin_key:
-                video_url = f"https://sns-video-bd.xhscdn.com/{origin_key}"
-                media_items.append({"urls": [video_url], "type": "video"})
-            else:
-                # 2) 回退：stream 列表，按清晰度选最优
-                media = video_info.get("media", {})
-                stream = media.get("stream", {})
-                video_url = self._pick_stream_url(stream)
-                if video_url:
-                    media_items.append({"urls": [video_url], "type": "video"})
-                else:
-                    return XiaohongshuParseResult(
-                        success=False, error="无法找到视频流", note_id=note_id
-                    )
+                variants.append(
+                    {
+                        "urls": [f"{ORIGIN_VIDEO_HOST}/{origin_key}"],
+                        "codec": "origin",
+                        "height": 0,
+                        "size": 0,
+                        "bitrate": 0,
+                        "duration": 0,
+                    }
+                )
+            media = video_info.get("media", {})
+            variants.extend(collect_stream_variants(media.get("stream", {})))
+            if not variants:
+                return XiaohongshuParseResult(
+                    success=False, error="无法找到视频流", note_id=note_id
+                )
+            video_url = variants[0]["urls"][0]
+            media_items.append(
+                {
+                    "urls": variants[0]["urls"],
+                    "type": "video",
+                    "variants": variants,
+                    "duration": video_duration,
+                }
+            )
 
         else:
             img_list = note.get("imageList", [])
@@ -320,7 +329,15 @@ class XiaohongshuParser:
                         continue
 
                 clean_url = self._get_raw_image_url(raw_url)
-                if self.prefer_original:
+                if self.image_quality == "balanced":
+                    media_items.append(
+                        {
+                            "urls": [clean_url, raw_url],
+                            "type": "image",
+                            "variants": build_image_variants(clean_url),
+                        }
+                    )
+                elif self.prefer_original:
                     media_items.append({"urls": [clean_url, raw_url], "type": "image"})
                 else:
                     media_items.append({"urls": [raw_url, clean_url], "type": "image"})
@@ -365,35 +382,8 @@ class XiaohongshuParser:
 
     @staticmethod
     def _pick_stream_url(stream: dict) -> str:
-        # Combine h264 + h265 tracks, sort by quality (height desc)
-        tracks = []
-        for codec in ("h264", "h265", "av1", "h266"):
-            t = stream.get(codec, [])
-            if isinstance(t, list):
-                tracks.extend(t)
-        if not tracks:
-            return ""
-
-        tracks.sort(
-            key=lambda t: t.get("height", 0) if isinstance(t, dict) else 0, reverse=True
-        )
-
-        best = tracks[0] if isinstance(tracks[0], dict) else None
-        if not best:
-            return ""
-
-        # Prefer backupUrls[0] over masterUrl
-        burls = best.get("backupUrls")
-        if burls and isinstance(burls, list) and burls[0]:
-            url = burls[0]
-        else:
-            url = best.get("masterUrl", "")
-
-        if url:
-            if url.startswith("//"):
-                url = "https:" + url
-            return url
-        return ""
+        variants = collect_stream_variants(stream)
+        return variants[0]["urls"][0] if variants else ""
 
     @staticmethod
     def _clean_webpic_path(path: str) -> str:
@@ -0,0 +1,156 @@
+"""
+小红书视频变体选择
+
+解析阶段收集原视频与 stream 列表中的全部变体，下载前按体积预算挑选：
+- 清晰度从高到低，同清晰度下优先兼容性更好的编码
+- 体积依次取 stream 条目的 size、码率 × 时长、HLS 的 BANDWIDTH × 时长、
+  原视频的 Content-Length
+- 第一个不超出预算的变体胜出；全部超出时选体积最小的；
+  大小未知的变体只在没有任何已知大小的变体时使用
+"""
+
+from astrbot.api import logger
+
+from ..http_pool import get_http_client
+from .constants import DEFAULT_TIMEOUT, DOWNLOAD_HEADERS, XHS_CODEC_ORDER
+from .hls import fetch_playlist, parse_master_playlist, pick_hls_variant
+
+
+def codec_rank(codec: str) -> int:
+    try:
+        return XHS_CODEC_ORDER.index(codec)
+    except ValueError:
+        return len(XHS_CODEC_ORDER)
+
+
+def _https(url: str) -> str:
+    if url.startswith("//"):
+        return "https:" + url
+    if url.startswith("http://"):
+        return "https://" + url[7:]
+    return url
+
+
+def collect_stream_variants(stream: dict) -> list[dict]:
+    """
+    将 stream 中各编码的条目整理为变体列表，按 (清晰度降序, 编码兼容性) 排序。
+    每个变体：{"urls", "codec", "height", "size", "bitrate", "duration"}
+    """
+    variants = []
+    for codec in XHS_CODEC_ORDER:
+        tracks = stream.get(codec, [])
+        if not isinstance(tracks, list):
+            continue
+        for track in tracks:
+            if not isinstance(track, dict):
+                continue
+            urls = []
+            # 优先 backupUrls[0]，masterUrl 作为备用
+            backup_urls = track.get("backupUrls")
+            if isinstance(backup_urls, list) and backup_urls and backup_urls[0]:
+                urls.append(_https(backup_urls[0]))
+            master_url = track.get("masterUrl")
+            if master_url and _https(master_url) not in urls:
+                urls.append(_https(master_url))
+            if not urls:
+                continue
+            variants.append(
+                {
+                    "urls": urls,
+                    "codec": codec,
+                    "height": int(track.get("height") or 0),
+                    "size": int(track.get("size") or 0),
+                    "bitrate": int(
+                        track.get("avgBitrate") or track.get("videoBitrate") or 0
+                    ),
+                    # stream 条目中的时长单位为毫秒
+                    "duration": (track.get("duration") or 0) / 1000,
+                }
+            )
+    variants.sort(key=lambda v: (-v["height"], codec_rank(v["codec"])))
+    return variants
+
+
+async def content_length(url: str) -> int:
+    client = get_http_client()
+    try:
+        resp = await client.head(url, headers=DOWNLOAD_HEADERS, timeout=DEFAULT_TIMEOUT)
+        if resp.status_code < 400 and resp.headers.get("Content-Length"):
+            return int(resp.headers["Content-Length"])
+        # 部分 CDN 不支持 HEAD，改用 Range 请求读取 Content-Range 中的总长度
+        headers = {**DOWNLOAD_HEADERS, "Range": "bytes=0-0"}
+        async with client.stream(
+            "GET", url, headers=headers, timeout=DEFAULT_TIMEOUT
+        ) as resp:
+            content_range = resp.headers.get("Content-Range", "")
+            if resp.status_code == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                return int(total) if total.isdigit() else 0
+    except Exception as e:
+        logger.debug(f"XHS 获取文件大小失败: {url}, {e}")
+    return 0
+
+
+async def _hls_size(url: str, max_bytes: float, duration: float) -> int:
+    try:
+        playlist = await fetch_playlist(url)
+    except Exception as e:
+        logger.debug(f"XHS M3U8 获取失败，无法估算大小: {url}, {e}")
+        return 0
+    if "#EXT-X-STREAM-INF" not in playlist:
+        return 0
+    chosen = pick_hls_variant(parse_master_playlist(playlist, url), max_bytes, duration)
+    return int(chosen.bandwidth * duration / 8) if chosen else 0
+
+
+async def expected_size(variant: dict, max_bytes: float, duration: float) -> int:
+    """估算变体的字节数，无法得知时返回 0。"""
+    if variant.get("size"):
+        return variant["size"]
+    seconds = variant.get("duration") or duration
+    if variant.get("bitrate") and seconds > 0:
+        return int(variant["bitrate"] * seconds / 8)
+    url = variant["urls"][0]
+    if ".m3u8" in url.lower():
+        return await _hls_size(url, max_bytes, seconds) if seconds > 0 else 0
+    return await content_length(url)
+
+
+async def select_variant(
+    variants: list[dict], max_bytes: float, duration: float = 0
+) -> dict | None:
+    """返回预算内最优的变体；不限大小时直接返回第一个。"""
+    if not variants:
+        return None
+    if max_bytes == float("inf"):
+        return variants[0]
+
+    smallest = None
+    unknown = None
+    for variant in variants:
+        size = await expected_size(variant, max_bytes, duration)
+        if not size:
+            # 大小未知（如原视频探测失败）可能正是超大的文件，只作为最后的选择
+            if unknown is None:
+                unknown = variant
+            continue
+        if size <= max_bytes:
+            logger.debug(
+                f"XHS 选择视频变体: {variant['codec']} {variant['height']}p，"
+                f"预计 {size / 1024 / 1024:.2f}MB"
+            )
+            return variant
+        if smallest is None or size < smallest[0]:
+            smallest = (size, variant)
+
+    if smallest:
+        size, variant = smallest
+        logger.info(
+            f"XHS 所有已知大小的视频变体均超出 {max_bytes / 1024 / 1024:.0f}MB，"
+            f"使用最小的 {variant['codec']} {variant['height']}p（{size / 1024 / 1024:.2f}MB）"
+        )
+        return variant
+    logger.debug(
+        f"XHS 视频变体大小均未知，直接使用: {unknown['codec']} {unknown['height']}p"
+    )
+    return unknown
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接以 modules.* 导入插件代码
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
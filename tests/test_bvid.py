@@ -0,0 +1,66 @@
+import pytest
+
+from modules.bilibili.constants import BV_MAX_AID
+from modules.bilibili.parser import av2bv, bv2av, normalize_bvid
+
+# B站 公布的 av/BV 对照
+KNOWN_PAIRS = [
+    (170001, "BV17x411w7KC"),
+    (455017605, "BV1Q541167Qg"),
+    (882584971, "BV1mK4y1C7Bz"),
+]
+
+
+@pytest.mark.parametrize("aid, bvid", KNOWN_PAIRS)
+def test_known_pairs(aid, bvid):
+    assert av2bv(aid) == bvid
+    assert av2bv(f"av{aid}") == bvid
+    assert bv2av(bvid) == aid
+
+
+@pytest.mark.parametrize("aid", [1, 2, 99, 10**6, 2**32, 2**40 + 7, BV_MAX_AID - 1])
+def test_round_trip(aid):
+    bvid = av2bv(aid)
+    assert bvid is not None and bvid.startswith("BV1") and len(bvid) == 12
+    assert bv2av(bvid) == aid
+
+
+@pytest.mark.parametrize("aid", [0, -1, BV_MAX_AID, BV_MAX_AID + 1])
+def test_out_of_range_aid_is_rejected(aid):
+    assert av2bv(aid) is None
+
+
+@pytest.mark.parametrize("ref", ["", "av", "avabc", "BV", "170001", None])
+def test_invalid_refs(ref):
+    assert av2bv(ref) is None
+    assert normalize_bvid(ref) is None
+
+
+@pytest.mark.parametrize(
+    "ref",
+    [
+        "av170001",
+        "AV170001",
+        "Av170001",
+        170001,
+        "BV17x411w7KC",
+        "bv17x411w7KC",
+        "Bv17x411w7KC",
+        "https://www.bilibili.com/video/av170001/",
+        "https://www.bilibili.com/video/BV17x411w7KC?p=1",
+        "https://m.bilibili.com/video/bv17x411w7KC",
+    ],
+)
+def test_normalize_to_canonical_bvid(ref):
+    assert normalize_bvid(ref) == "BV17x411w7KC"
+
+
+def test_bvid_body_is_case_sensitive():
+    # 只有 "BV" 前缀不区分大小写，编码部分改变大小写就是另一个视频
+    assert normalize_bvid("BV17X411W7kc") == "BV17X411W7kc"
+    assert bv2av("BV17X411W7kc") != 170001
+
+
+def test_bv2av_rejects_malformed():
+    assert bv2av("BV1") is None
+    assert bv2av("not a bvid") is None
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from modules.douyin.utils.slides import SlidesInfoBatcher, SlidesInfoError
+
+MISSING_ID = "999"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        aweme_ids = query["aweme_ids"][0].strip("[]").split(",")
+        self.server.requests.append(aweme_ids)
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.end_headers()
+            return
+        body = json.dumps(
+            {
+                "item_list": [
+                    {"aweme_id": aweme_id, "desc": f"slides {aweme_id}"}
+                    for aweme_id in aweme_ids
+                    if aweme_id != MISSING_ID
+                ]
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.requests = []
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _endpoint(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/slidesinfo/"
+
+
+def test_concurrent_lookups_share_batches(stub_server):
+    batcher = SlidesInfoBatcher(
+        endpoint=_endpoint(stub_server), window=0.05, max_batch=3
+    )
+    ids = [str(100 + i) for i in range(7)]
+
+    async def run():
+        return await asyncio.gather(*(batcher.fetch(i) for i in ids))
+
+    items = asyncio.run(run())
+
+    assert [item["aweme_id"] for item in items] == ids
+    # 7 个作品、单批 3 个：3 + 3 + 1
+    assert sorted(len(batch) for batch in stub_server.requests) == [1, 3, 3]
+    assert sorted(i for batch in stub_server.requests for i in batch) == ids
+
+
+def test_window_merges_lookups_below_batch_size(stub_server):
+    batcher = SlidesInfoBatcher(
+        endpoint=_endpoint(stub_server), window=0.2, max_batch=10
+    )
+
+    async def run():
+        first = asyncio.ensure_future(batcher.fetch("1"))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(batcher.fetch("2"))
+        return await asyncio.gather(first, second)
+
+    items = asyncio.run(run())
+
+    assert [item["aweme_id"] for item in items] == ["1", "2"]
+    assert stub_server.requests == [["1", "2"]]
+
+
+def test_duplicate_and_missing_ids(stub_server):
+    batcher = SlidesInfoBatcher(endpoint=_endpoint(stub_server), window=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.fetch("7"), batcher.fetch("7"), batcher.fetch(MISSING_ID)
+        )
+
+    first, second, missing = asyncio.run(run())
+
+    assert first["aweme_id"] == second["aweme_id"] == "7"
+    assert missing is None
+    assert stub_server.requests == [["7", MISSING_ID]]
+
+
+def test_http_error_fails_every_waiter(stub_server):
+    stub_server.status = 503
+    batcher = SlidesInfoBatcher(endpoint=_endpoint(stub_server), window=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.fetch("1"), batcher.fetch("2"), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, SlidesInfoError) for r in results)
+    assert len(stub_server.requests) == 1
+
+
+def test_configure_applies_to_later_batches(stub_server):
+    batcher = SlidesInfoBatcher(endpoint=_endpoint(stub_server))
+    batcher.configure(0, 0)
+
+    assert batcher.window == 0.0
+    assert batcher.max_batch == 1
+
+    async def run():
+        return await asyncio.gather(batcher.fetch("1"), batcher.fetch("2"))
+
+    asyncio.run(run())
+
+    assert stub_server.requests == [["1"], ["2"]]